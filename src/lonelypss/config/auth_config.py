@@ -231,6 +231,16 @@ class AuthConfigFromParts:
             authorization=authorization,
         )
 
+    @property
+    def incoming_auth_allows_all(self) -> bool:
+        """True if the incoming auth is known to allow every request"""
+        return getattr(self.incoming, "ALLOW_ALL", False) is True
+
+    @property
+    def outgoing_auth_is_noop(self) -> bool:
+        """True if the outgoing auth is known to never set an authorization header"""
+        return getattr(self.outgoing, "IS_NOOP", False) is True
+
     async def setup_authorization(
         self, /, *, url: str, topic: bytes, message_sha512: bytes, now: float
     ) -> Optional[str]:
@@ -239,5 +249,21 @@ class AuthConfigFromParts:
         )
 
 
+def is_incoming_auth_allow_all(config: object) -> bool:
+    """True if the given config is known to allow every incoming request, so the
+    is_*_allowed checks can be skipped. This is not part of the auth protocols, so
+    configs which don't opt in are always asked
+    """
+    return getattr(config, "incoming_auth_allows_all", False) is True
+
+
+def is_outgoing_auth_noop(config: object) -> bool:
+    """True if the given config is known to never set an authorization header, so
+    setup_authorization can be skipped. This is not part of the auth protocols, so
+    configs which don't opt in are always asked
+    """
+    return getattr(config, "outgoing_auth_is_noop", False) is True
+
+
 if TYPE_CHECKING:
     _: Type[AuthConfig] = AuthConfigFromParts
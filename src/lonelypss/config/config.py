@@ -14,6 +14,8 @@ from typing import (
     Union,
 )
 
+import aiohttp
+
 from lonelypss.config.auth_config import AuthConfig
 
 try:
@@ -147,6 +149,13 @@ class GenericConfig(Protocol):
         body of a compressed message) that is held in memory before spooling to file.
         """
 
+    @property
+    def max_message_body_size(self) -> Optional[int]:
+        """The largest message, in bytes, that we will accept for a notification over
+        http, or None for no limit. Since the length is sent before the message, larger
+        messages are rejected before any of the message is read.
+        """
+
     @property
     def outgoing_http_timeout_total(self) -> Optional[float]:
         """The total timeout for outgoing http requests in seconds"""
@@ -167,6 +176,37 @@ class GenericConfig(Protocol):
     def outgoing_http_timeout_sock_connect(self) -> Optional[float]:
         """The timeout for a single socket connecting to the server before we give up in seconds"""
 
+    @property
+    def outgoing_http_max_concurrency(self) -> Optional[int]:
+        """The maximum number of outgoing http requests for a single notification that
+        may be in flight at once, or None for no limit. Subscribers are otherwise notified
+        concurrently, so the time to notify a topic is closer to the slowest subscriber
+        rather than the sum over all subscribers.
+
+        A reasonable value is 32
+        """
+
+    @property
+    def outgoing_http_max_connections(self) -> Optional[int]:
+        """The maximum number of simultaneous outgoing http connections shared by
+        all notifications, or None for no limit. Requests past this limit wait for
+        a free connection, and that wait counts towards the outgoing timeouts, so
+        this should be well above `outgoing_http_max_concurrency` or None to let
+        that per-notification limit do the bounding.
+
+        A reasonable value is None
+        """
+
+    @property
+    def outgoing_http_max_connections_per_host(self) -> Optional[int]:
+        """The maximum number of simultaneous outgoing http connections to a single
+        subscriber host, or None for no limit. As with
+        `outgoing_http_max_connections`, requests past this limit wait and the
+        wait counts towards the outgoing timeouts.
+
+        A reasonable value is None
+        """
+
     @property
     def websocket_accept_timeout(self) -> Optional[float]:
         """The timeout for accepting a websocket connection in seconds"""
@@ -250,6 +290,10 @@ class GenericConfigFromValues:
         websocket_large_direct_send_timeout: Optional[float],
         websocket_send_max_unacknowledged: Optional[int],
         websocket_minimal_headers: bool,
+        max_message_body_size: Optional[int] = None,
+        outgoing_http_max_concurrency: Optional[int] = 32,
+        outgoing_http_max_connections: Optional[int] = None,
+        outgoing_http_max_connections_per_host: Optional[int] = None,
     ):
         self.message_body_spool_size = message_body_spool_size
         self.outgoing_http_timeout_total = outgoing_http_timeout_total
@@ -262,6 +306,12 @@ class GenericConfigFromValues:
         self.websocket_large_direct_send_timeout = websocket_large_direct_send_timeout
         self.websocket_send_max_unacknowledged = websocket_send_max_unacknowledged
         self.websocket_minimal_headers = websocket_minimal_headers
+        self.max_message_body_size = max_message_body_size
+        self.outgoing_http_max_concurrency = outgoing_http_max_concurrency
+        self.outgoing_http_max_connections = outgoing_http_max_connections
+        self.outgoing_http_max_connections_per_host = (
+            outgoing_http_max_connections_per_host
+        )
 
 
 class CompressionConfig(Protocol):
@@ -353,7 +403,9 @@ class CompressionConfig(Protocol):
             zdict = await asyncio.to_thread(
                 zstandard.train_dictionary,
                 16384,
-                samples
+                samples,
+                k=200,
+                d=8
             )
             await asyncio.to_thread(zdict.precompute_compress, level=3)
             return (zdict, 3)
@@ -485,19 +537,93 @@ class CompressionConfigFromParts:
     async def train_compression_dict_low_watermark(
         self, /, samples: List[bytes]
     ) -> "Tuple[zstandard.ZstdCompressionDict, int]":
-        zdict = await asyncio.to_thread(zstandard.train_dictionary, 16384, samples)
-        await asyncio.to_thread(zdict.precompute_compress, level=3)
+        # fixing k and d skips the parameter search, which is most of the cost
+        # and gains little when there are only a few samples to learn from
+        zdict = await asyncio.to_thread(
+            _train_and_precompute, 16384, samples, 3, k=200, d=8
+        )
         return (zdict, 3)
 
     async def train_compression_dict_high_watermark(
         self, /, samples: List[bytes]
     ) -> "Tuple[zstandard.ZstdCompressionDict, int]":
-        zdict = await asyncio.to_thread(zstandard.train_dictionary, 65536, samples)
-        await asyncio.to_thread(zdict.precompute_compress, level=10)
+        zdict = await asyncio.to_thread(_train_and_precompute, 65536, samples, 10)
         return (zdict, 10)
 
 
-class Config(AuthConfig, DBConfig, GenericConfig, CompressionConfig, Protocol):
+def _train_and_precompute(
+    dict_size: int, samples: List[bytes], level: int, *, k: int = 0, d: int = 0
+) -> "zstandard.ZstdCompressionDict":
+    """Trains a compression dictionary and precomputes it for the given level.
+    Meant to be run in a worker thread as a single unit so the event loop only
+    has to hand off and pick up the work once; zstandard releases the GIL while
+    training, so this does not block other connections
+
+    k and d are the segment and dmer sizes for the trainer; when left at 0,
+    zstandard searches for good values, which is slower but more accurate
+    """
+    zdict = zstandard.train_dictionary(dict_size, samples, k=k, d=d)
+    zdict.precompute_compress(level=level)
+    return zdict
+
+
+class HttpClientConfig(Protocol):
+    """Manages the long-lived outgoing http client used for notifying subscribers.
+
+    This is not part of the Config protocol, so existing configs keep working:
+    for configs which do not implement it, `setup_config` creates the session via
+    `make_http_client_session` instead. Use `get_http_client_session` from
+    `lonelypss.config.lifespan` rather than `http_client_session` directly
+    """
+
+    async def setup_http_client(self) -> None:
+        """Prepares the shared aiohttp ClientSession. This is called from within the
+        event loop that will use the session. If not re-entrant, it must check for
+        re-entrant calls and error out
+        """
+
+    async def teardown_http_client(self) -> None:
+        """Closes the shared aiohttp ClientSession, releasing any pooled connections"""
+
+    @property
+    def http_client_session(self) -> aiohttp.ClientSession:
+        """The shared aiohttp ClientSession to use for outgoing requests to subscribers.
+        Reusing a single session allows keep-alive connections to subscribers to be
+        pooled across notifications. Only available between `setup_http_client` and
+        `teardown_http_client`.
+        """
+
+
+def make_http_client_session(config: GenericConfig) -> aiohttp.ClientSession:
+    """Creates the aiohttp ClientSession to share across all outgoing requests to
+    subscribers, configured from the outgoing http settings of the given config.
+    Must be called from within the event loop that will use the session
+    """
+    # subscribers are contacted repeatedly, so idle connections and dns results
+    # are kept around well beyond aiohttp's defaults to avoid new handshakes.
+    # the connection limits are always set explicitly (0 meaning unlimited) as
+    # aiohttp's default of 100 is easily reached by concurrent notifications
+    max_connections = config.outgoing_http_max_connections
+    max_connections_per_host = config.outgoing_http_max_connections_per_host
+    return aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(
+            limit=0 if max_connections is None else max_connections,
+            limit_per_host=(
+                0 if max_connections_per_host is None else max_connections_per_host
+            ),
+            keepalive_timeout=60,
+            ttl_dns_cache=300,
+        )
+    )
+
+
+class Config(
+    AuthConfig,
+    DBConfig,
+    GenericConfig,
+    CompressionConfig,
+    Protocol,
+):
     """The injected behavior required for the lonelypss to operate. This is
     generally generated for you using one of the templates, see the readme for details
     """
@@ -517,6 +643,7 @@ class ConfigFromParts:
         self.db = db
         self.generic = generic
         self.compression = compression
+        self._http_client_session: Optional[aiohttp.ClientSession] = None
 
     async def setup_incoming_auth(self) -> None:
         await self.auth.setup_incoming_auth()
@@ -536,6 +663,21 @@ class ConfigFromParts:
     async def teardown_db(self) -> None:
         await self.db.teardown_db()
 
+    async def setup_http_client(self) -> None:
+        assert self._http_client_session is None, "http client is not re-entrant"
+        self._http_client_session = make_http_client_session(self)
+
+    async def teardown_http_client(self) -> None:
+        session = self._http_client_session
+        self._http_client_session = None
+        if session is not None:
+            await session.close()
+
+    @property
+    def http_client_session(self) -> aiohttp.ClientSession:
+        assert self._http_client_session is not None, "http client not setup"
+        return self._http_client_session
+
     async def is_subscribe_exact_allowed(
         self, /, *, url: str, exact: bytes, now: float, authorization: Optional[str]
     ) -> Literal["ok", "unauthorized", "forbidden", "unavailable"]:
@@ -584,6 +726,16 @@ class ConfigFromParts:
             authorization=authorization,
         )
 
+    @property
+    def incoming_auth_allows_all(self) -> bool:
+        """True if the incoming auth is known to allow every request"""
+        return getattr(self.auth, "incoming_auth_allows_all", False) is True
+
+    @property
+    def outgoing_auth_is_noop(self) -> bool:
+        """True if the outgoing auth is known to never set an authorization header"""
+        return getattr(self.auth, "outgoing_auth_is_noop", False) is True
+
     async def setup_authorization(
         self, /, *, url: str, topic: bytes, message_sha512: bytes, now: float
     ) -> Optional[str]:
@@ -618,6 +770,10 @@ class ConfigFromParts:
     def message_body_spool_size(self) -> int:
         return self.generic.message_body_spool_size
 
+    @property
+    def max_message_body_size(self) -> Optional[int]:
+        return self.generic.max_message_body_size
+
     @property
     def outgoing_http_timeout_total(self) -> Optional[float]:
         return self.generic.outgoing_http_timeout_total
@@ -634,6 +790,18 @@ class ConfigFromParts:
     def outgoing_http_timeout_sock_connect(self) -> Optional[float]:
         return self.generic.outgoing_http_timeout_sock_connect
 
+    @property
+    def outgoing_http_max_concurrency(self) -> Optional[int]:
+        return self.generic.outgoing_http_max_concurrency
+
+    @property
+    def outgoing_http_max_connections(self) -> Optional[int]:
+        return self.generic.outgoing_http_max_connections
+
+    @property
+    def outgoing_http_max_connections_per_host(self) -> Optional[int]:
+        return self.generic.outgoing_http_max_connections_per_host
+
     @property
     def websocket_accept_timeout(self) -> Optional[float]:
         return self.generic.websocket_accept_timeout
@@ -714,3 +882,4 @@ if TYPE_CHECKING:
     __: Type[GenericConfig] = GenericConfigFromValues
     ___: Type[CompressionConfig] = CompressionConfigFromParts
     ____: Type[Config] = ConfigFromParts
+    _____: Type[HttpClientConfig] = ConfigFromParts
@@ -1,9 +1,11 @@
 import asyncio
 import base64
+import binascii
 import hmac
 import math
 import secrets
 import sqlite3
+import struct
 import time
 from typing import TYPE_CHECKING, Literal, Optional, Protocol, Tuple, Type, Union, cast
 
@@ -13,6 +15,12 @@ if TYPE_CHECKING:
         OutgoingAuthConfig,
     )
 
+_TIMESTAMP_AND_NONCE_LENGTH = struct.Struct(">QB")
+"""the timestamp and nonce length that prefix every signed payload"""
+
+_UINT16 = struct.Struct(">H")
+"""the length prefix for variable length fields in signed payloads"""
+
 
 class IncomingHmacAuthDBConfig(Protocol):
     async def setup_hmac_auth_db(self) -> None: ...
@@ -294,17 +302,15 @@ class IncomingHmacAuth:
 
         timestamp, nonce, hmac_token = token[1]
         encoded_url = url.encode("utf-8")
-        encoded_timestamp = timestamp.to_bytes(8, "big")
         encoded_nonce = nonce.encode("utf-8")
 
         to_sign = b"".join(
             [
-                encoded_timestamp,
-                len(encoded_nonce).to_bytes(1, "big"),
+                _TIMESTAMP_AND_NONCE_LENGTH.pack(timestamp, len(encoded_nonce)),
                 encoded_nonce,
-                len(encoded_url).to_bytes(2, "big"),
+                _UINT16.pack(len(encoded_url)),
                 encoded_url,
-                len(exact).to_bytes(2, "big"),
+                _UINT16.pack(len(exact)),
                 exact,
             ]
         )
@@ -319,18 +325,16 @@ class IncomingHmacAuth:
 
         timestamp, nonce, hmac_token = result[1]
         encoded_url = url.encode("utf-8")
-        encoded_timestamp = timestamp.to_bytes(8, "big")
         encoded_glob = glob.encode("utf-8")
         encoded_nonce = nonce.encode("utf-8")
 
         to_sign = b"".join(
             [
-                encoded_timestamp,
-                len(encoded_nonce).to_bytes(1, "big"),
+                _TIMESTAMP_AND_NONCE_LENGTH.pack(timestamp, len(encoded_nonce)),
                 encoded_nonce,
-                len(encoded_url).to_bytes(2, "big"),
+                _UINT16.pack(len(encoded_url)),
                 encoded_url,
-                len(encoded_glob).to_bytes(2, "big"),
+                _UINT16.pack(len(encoded_glob)),
                 encoded_glob,
             ]
         )
@@ -351,15 +355,13 @@ class IncomingHmacAuth:
             return result[0]
 
         timestamp, nonce, hmac_token = result[1]
-        encoded_timestamp = timestamp.to_bytes(8, "big")
         encoded_nonce = nonce.encode("utf-8")
 
         to_sign = b"".join(
             [
-                encoded_timestamp,
-                len(encoded_nonce).to_bytes(1, "big"),
+                _TIMESTAMP_AND_NONCE_LENGTH.pack(timestamp, len(encoded_nonce)),
                 encoded_nonce,
-                len(topic).to_bytes(2, "big"),
+                _UINT16.pack(len(topic)),
                 topic,
                 message_sha512,
             ]
@@ -383,16 +385,14 @@ class IncomingHmacAuth:
 
         timestamp, nonce, hmac_token = result[1]
         encoded_url = url.encode("utf-8")
-        encoded_timestamp = timestamp.to_bytes(8, "big")
         encoded_nonce = nonce.encode("utf-8")
         to_sign = b"".join(
             [
-                encoded_timestamp,
-                len(encoded_nonce).to_bytes(1, "big"),
+                _TIMESTAMP_AND_NONCE_LENGTH.pack(timestamp, len(encoded_nonce)),
                 encoded_nonce,
-                len(encoded_url).to_bytes(2, "big"),
+                _UINT16.pack(len(encoded_url)),
                 encoded_url,
-                len(topic).to_bytes(2, "big"),
+                _UINT16.pack(len(topic)),
                 topic,
                 message_sha512,
             ]
@@ -423,9 +423,7 @@ class OutgoingHmacAuth:
 
     def _sign(self, to_sign: bytes, nonce: str, now: float) -> str:
         hmac_token = hmac.new(self.secret, to_sign, "sha512").digest()
-        return (
-            f"X-HMAC {int(now)}:{nonce}:{base64.b64encode(hmac_token).decode('ascii')}"
-        )
+        return f"X-HMAC {int(now)}:{nonce}:{binascii.b2a_base64(hmac_token, newline=False).decode('ascii')}"
 
     async def setup_authorization(
         self, /, *, url: str, topic: bytes, message_sha512: bytes, now: float
@@ -433,17 +431,15 @@ class OutgoingHmacAuth:
         assert len(message_sha512) == 64, "message_sha512 must be 64 bytes long"
         nonce = self._make_nonce()
         encoded_url = url.encode("utf-8")
-        encoded_timestamp = int(now).to_bytes(8, "big")
         encoded_nonce = nonce.encode("utf-8")
 
         to_sign = b"".join(
             [
-                encoded_timestamp,
-                len(encoded_nonce).to_bytes(1, "big"),
+                _TIMESTAMP_AND_NONCE_LENGTH.pack(int(now), len(encoded_nonce)),
                 encoded_nonce,
-                len(encoded_url).to_bytes(2, "big"),
+                _UINT16.pack(len(encoded_url)),
                 encoded_url,
-                len(topic).to_bytes(2, "big"),
+                _UINT16.pack(len(topic)),
                 topic,
                 message_sha512,
             ]
@@ -15,6 +15,9 @@ class IncomingNoneAuth:
     level)
     """
 
+    ALLOW_ALL: Literal[True] = True
+    """Marks that every is_*_allowed check returns "ok", so callers may skip them"""
+
     async def setup_incoming_auth(self) -> None: ...
     async def teardown_incoming_auth(self) -> None: ...
 
@@ -57,6 +60,9 @@ class OutgoingNoneAuth:
     subscribers must only be able to receive messages from trusted clients.
     """
 
+    IS_NOOP: Literal[True] = True
+    """Marks that setup_authorization always returns None, so callers may skip it"""
+
     async def setup_outgoing_auth(self) -> None: ...
     async def teardown_outgoing_auth(self) -> None: ...
 
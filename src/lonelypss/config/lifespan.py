@@ -1,4 +1,53 @@
-from lonelypss.config.config import Config
+from typing import Dict, cast
+
+import aiohttp
+
+from lonelypss.config.config import Config, HttpClientConfig, make_http_client_session
+
+_FALLBACK_HTTP_CLIENT_SESSIONS: Dict[int, aiohttp.ClientSession] = {}
+"""The shared http client sessions for configs which do not implement
+HttpClientConfig, keyed by the id of the config, between setup_config and
+teardown_config
+"""
+
+
+def _has_http_client(config: Config) -> bool:
+    """True if the config manages its own http client session"""
+    return hasattr(config, "setup_http_client")
+
+
+def get_http_client_session(config: Config) -> aiohttp.ClientSession:
+    """The shared aiohttp ClientSession for outgoing requests to subscribers. This
+    is the configs own session if it implements HttpClientConfig, otherwise the
+    one created for it by setup_config
+    """
+    if _has_http_client(config):
+        return cast(HttpClientConfig, config).http_client_session
+
+    session = _FALLBACK_HTTP_CLIENT_SESSIONS.get(id(config))
+    assert session is not None, "http client not setup"
+    return session
+
+
+async def _setup_http_client(config: Config) -> None:
+    if _has_http_client(config):
+        await cast(HttpClientConfig, config).setup_http_client()
+        return
+
+    assert (
+        id(config) not in _FALLBACK_HTTP_CLIENT_SESSIONS
+    ), "http client is not re-entrant"
+    _FALLBACK_HTTP_CLIENT_SESSIONS[id(config)] = make_http_client_session(config)
+
+
+async def _teardown_http_client(config: Config) -> None:
+    if _has_http_client(config):
+        await cast(HttpClientConfig, config).teardown_http_client()
+        return
+
+    session = _FALLBACK_HTTP_CLIENT_SESSIONS.pop(id(config), None)
+    if session is not None:
+        await session.close()
 
 
 async def setup_config(config: Config) -> None:
@@ -8,6 +57,11 @@ async def setup_config(config: Config) -> None:
         await config.setup_outgoing_auth()
         try:
             await config.setup_db()
+            try:
+                await _setup_http_client(config)
+            except BaseException:
+                await config.teardown_db()
+                raise
         except BaseException:
             await config.teardown_outgoing_auth()
             raise
@@ -19,9 +73,12 @@ async def setup_config(config: Config) -> None:
 async def teardown_config(config: Config) -> None:
     """Convenience function to teardown the configuration (similiar idea to aenter)"""
     try:
-        await config.teardown_db()
+        await _teardown_http_client(config)
     finally:
         try:
-            await config.teardown_outgoing_auth()
+            await config.teardown_db()
         finally:
-            await config.teardown_incoming_auth()
+            try:
+                await config.teardown_outgoing_auth()
+            finally:
+                await config.teardown_incoming_auth()
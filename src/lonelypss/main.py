@@ -246,6 +246,10 @@ def _make_config() -> Config:{load_auth_secrets}
             websocket_large_direct_send_timeout=0.3,
             websocket_send_max_unacknowledged=3,
             websocket_minimal_headers=True,
+            max_message_body_size=1024 * 1024 * 1024,
+            outgoing_http_max_concurrency=32,
+            outgoing_http_max_connections=None,
+            outgoing_http_max_connections_per_host=None,
         ),
         compression=CompressionConfigFromParts(
             compression_allowed=True,
@@ -1,45 +1,101 @@
-import base64
+import asyncio
+import binascii
 import hashlib
+import io
 import json
 import logging
+import os
+import struct
 import tempfile
 import time
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import Annotated, Dict, Literal, Optional, Union
+from types import MappingProxyType
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Callable,
+    List,
+    Literal,
+    Mapping,
+    Optional,
+    Union,
+)
 
 import aiohttp
-from fastapi import APIRouter, Header, Request, Response
+from aiohttp import hdrs
+from fastapi import APIRouter, Request, Response
+from multidict import istr
 from pydantic import BaseModel, Field
 
-from lonelypss.config.config import Config
+from lonelypss.config.auth_config import (
+    is_incoming_auth_allow_all,
+    is_outgoing_auth_noop,
+)
+from lonelypss.config.config import Config, SubscriberInfoExact, SubscriberInfoGlob
+from lonelypss.config.lifespan import get_http_client_session
 from lonelypss.middleware.config import get_config_from_request
-from lonelypss.util.close_guarded_io import CloseGuardedIO
-from lonelypss.util.sync_io import SyncIOBaseLikeIO, read_exact
+from lonelypss.util.openapi import optional_header_parameters
+from lonelypss.util.sync_io import SyncIOBaseLikeIO
+from lonelypss.ws.handlers.open.errors import combine_multiple_exceptions
+
+_HASH_CHUNK_SIZE = 128 * 1024
+"""How many bytes of the message we accumulate before hashing them"""
+
+_UINT16 = struct.Struct(">H")
+_UINT64 = struct.Struct(">Q")
+
+_READ_CHUNK_SIZE = 128 * 1024
+"""How many bytes we read at a time when posting a message backed by a file"""
+
+_MAX_REJECTION_BODY_SIZE = 4096
+"""The most we will read of a subscriber's json error response when checking if
+it wants to be unsubscribed
+"""
+
+_REPR_DIGEST = istr("Repr-Digest")
+_X_TOPIC = istr("X-Topic")
+"""Header names we send that aiohttp does not predefine; as with those in
+`aiohttp.hdrs`, using istr avoids re-normalizing the name on every request
+"""
+
+_AUTH_NOW_REFRESH_INTERVAL = 1.0
+"""How many seconds a single timestamp is reused for setting up authorization
+across the subscribers of one notification
+"""
 
 
 class NotifyResponse(BaseModel):
     notified: int = Field(description="The number of subscribers successfully notified")
 
 
+_NOTIFY_RESPONSE_JSON = b'{"notified":%d}'
+"""The serialized form of NotifyResponse, which is only used for documentation"""
+
+
 router = APIRouter()
 
 
 @router.post(
     "/v1/notify",
     status_code=200,
-    response_model=NotifyResponse,
     responses={
-        "400": {"description": "The body was not formatted correctly"},
+        "200": {
+            "model": NotifyResponse,
+            "description": "Subscribers were notified",
+        },
+        "400": {
+            "description": "The body was not formatted correctly or the message is too large"
+        },
         "401": {"description": "Authorization header is required but not provided"},
         "403": {"description": "Authorization header is provided but invalid"},
         "500": {"description": "Unexpected error occurred"},
         "503": {"description": "Service is unavailable, try again soon"},
     },
+    openapi_extra=optional_header_parameters("authorization"),
 )
-async def notify(
-    request: Request, authorization: Annotated[Optional[str], Header()] = None
-) -> Response:
+async def notify(request: Request) -> Response:
     """Sends the given message to subscribers for the given topic. The body should be
     formatted as the following sequence:
 
@@ -54,39 +110,54 @@ async def notify(
 
     - 200 Okay: subscribers were notified. Response body is in JSON format,
       containing the `notified` key with the number of subscribers notified.
-    - 400 Bad Request: the body was not formatted correctly
+    - 400 Bad Request: the body was not formatted correctly, or the message is
+      larger than the configured maximum
     - 401 Unauthorized: authorization is required but not provided
     - 403 Forbidden: authorization is provided but invalid
     - 500 Internal Server Error: unexpected error occurred
     - 503 Service Unavailable: servce (generally, database) is unavailable
     """
     config = get_config_from_request(request)
+    authorization = request.headers.get("authorization")
 
-    with tempfile.SpooledTemporaryFile(
-        max_size=config.message_body_spool_size, mode="w+b"
-    ) as request_body:
-        read_length = 0
-        saw_end = False
-
-        stream_iter = request.stream().__aiter__()
-        while True:
-            try:
-                chunk = await stream_iter.__anext__()
-            except StopAsyncIteration:
-                saw_end = True
-                break
-
-            request_body.write(chunk)
-            read_length += len(chunk)
-            if read_length >= 2 + 65535 + 64 + 8:
-                break
-
-        request_body.seek(0)
-        topic_length = int.from_bytes(read_exact(request_body, 2), "big")
-        topic = read_exact(request_body, topic_length)
-        message_hash = read_exact(request_body, 64)
-        message_length = int.from_bytes(read_exact(request_body, 8), "big")
+    # the header is small and bounded, so it is parsed from memory; only the
+    # message itself is spooled
+    header_buf = bytearray()
+    header_length: Optional[int] = None
+    saw_end = False
 
+    stream_iter = request.stream().__aiter__()
+    while header_length is None or len(header_buf) < header_length:
+        try:
+            chunk = await stream_iter.__anext__()
+        except StopAsyncIteration:
+            saw_end = True
+            break
+
+        header_buf.extend(chunk)
+        if header_length is None and len(header_buf) >= 2:
+            header_length = 2 + _UINT16.unpack_from(header_buf, 0)[0] + 64 + 8
+
+    if header_length is None or len(header_buf) < header_length:
+        return Response(status_code=400)
+
+    header_view = memoryview(header_buf)
+    topic_length = header_length - 2 - 64 - 8
+    topic = bytes(header_view[2 : 2 + topic_length])
+    message_hash = bytes(header_view[2 + topic_length : 2 + topic_length + 64])
+    (message_length,) = _UINT64.unpack_from(header_view, 2 + topic_length + 64)
+
+    max_message_body_size = config.max_message_body_size
+    if max_message_body_size is not None and message_length > max_message_body_size:
+        return Response(status_code=400)
+
+    # the chunks that contained the header may already hold more than the message
+    if len(header_buf) - header_length > message_length:
+        return Response(status_code=400)
+
+    if is_incoming_auth_allow_all(config):
+        auth_result = "ok"
+    else:
         auth_at = time.time()
         auth_result = await config.is_notify_allowed(
             topic=topic,
@@ -95,75 +166,89 @@ async def notify(
             authorization=authorization,
         )
 
-        if auth_result == "unauthorized":
-            return Response(status_code=401)
-        elif auth_result == "forbidden":
-            return Response(status_code=403)
-        elif auth_result == "unavailable":
-            return Response(status_code=503)
-        elif auth_result != "ok":
-            return Response(status_code=500)
+    if auth_result == "unauthorized":
+        return Response(status_code=401)
+    elif auth_result == "forbidden":
+        return Response(status_code=403)
+    elif auth_result == "unavailable":
+        return Response(status_code=503)
+    elif auth_result != "ok":
+        return Response(status_code=500)
+
+    # the message is kept in memory until it exceeds the spool size, at which
+    # point it is moved to a temporary file and only the tail is kept in memory
+    body = bytearray(header_view[header_length:])
+    body_file: Optional[BinaryIO] = None
+    hashed_length = 0
+    read_length = len(body)
+    hasher = hashlib.sha512()
+
+    try:
+        while not saw_end:
+            try:
+                chunk = await stream_iter.__anext__()
+            except StopAsyncIteration:
+                break
+
+            body.extend(chunk)
+            read_length += len(chunk)
 
-        hasher = hashlib.sha512()
+            if read_length > message_length:
+                return Response(status_code=400)
 
-        while True:
-            chunk = request_body.read(4096)
-            if not chunk:
-                break
-            hasher.update(chunk)
+            # asgi servers tend to deliver small chunks; batching them amortizes
+            # the per-call overhead and lets hashlib release the GIL
+            if len(body) - hashed_length < _HASH_CHUNK_SIZE:
+                continue
+
+            with memoryview(body) as body_view:
+                hasher.update(body_view[hashed_length:])
+            hashed_length = len(body)
 
-        if not saw_end:
-            while True:
-                try:
-                    chunk = await stream_iter.__anext__()
-                except StopAsyncIteration:
-                    saw_end = True
-                    break
+            if body_file is None and len(body) > config.message_body_spool_size:
+                body_file = tempfile.TemporaryFile("w+b")
 
-                hasher.update(chunk)
-                request_body.write(chunk)
-                read_length += len(chunk)
+            if body_file is not None:
+                body_file.write(body)
+                body.clear()
+                hashed_length = 0
 
-                if read_length > 2 + topic_length + 64 + 8 + message_length:
-                    return Response(status_code=400)
+        with memoryview(body) as body_view:
+            hasher.update(body_view[hashed_length:])
 
-        if read_length != 2 + topic_length + 64 + 8 + message_length:
+        if read_length != message_length:
             return Response(status_code=400)
 
         actual_hash = hasher.digest()
         if actual_hash != message_hash:
             return Response(status_code=400)
 
-        request_body.seek(2 + topic_length + 64 + 8)
-        async with aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(
-                total=config.outgoing_http_timeout_total,
-                connect=config.outgoing_http_timeout_connect,
-                sock_read=config.outgoing_http_timeout_sock_read,
-                sock_connect=config.outgoing_http_timeout_sock_connect,
-            )
-        ) as session:
-            notify_result = await handle_trusted_notify(
-                topic,
-                request_body,
-                config=config,
-                session=session,
-                content_length=message_length,
-                sha512=actual_hash,
-            )
-
-        if notify_result.type == TrustedNotifyResultType.UNAVAILABLE:
-            return Response(status_code=503)
-
-        return Response(
-            status_code=200,
-            content=NotifyResponse.__pydantic_serializer__.to_json(
-                NotifyResponse(notified=notify_result.succeeded)
-            ),
-            headers={
-                "Content-Type": "application/json; charset=utf-8",
-            },
+        if body_file is not None:
+            body_file.write(body)
+            body_file.seek(0)
+
+        notify_result = await handle_trusted_notify(
+            topic,
+            memoryview(body) if body_file is None else body_file,
+            config=config,
+            session=get_http_client_session(config),
+            content_length=message_length,
+            sha512=actual_hash,
         )
+    finally:
+        if body_file is not None:
+            body_file.close()
+
+    if notify_result.type == TrustedNotifyResultType.UNAVAILABLE:
+        return Response(status_code=503)
+
+    return Response(
+        status_code=200,
+        content=_NOTIFY_RESPONSE_JSON % notify_result.succeeded,
+        headers={
+            "Content-Type": "application/json; charset=utf-8",
+        },
+    )
 
 
 class TrustedNotifyResultType(Enum):
@@ -200,7 +285,7 @@ TrustedNotifyResult = Union[TrustedNotifyResultOK, TrustedNotifyResultUnavailabl
 
 async def handle_trusted_notify(
     topic: bytes,
-    data: SyncIOBaseLikeIO,
+    data: Union[SyncIOBaseLikeIO, bytes, memoryview],
     /,
     *,
     config: Config,
@@ -210,87 +295,263 @@ async def handle_trusted_notify(
 ) -> TrustedNotifyResult:
     """Notifies subscribers to the given topic with the given data.
 
+    Subscribers that cannot be reached or reject the message are counted as
+    failed. Any other error (e.g., from setting up authorization) is raised once
+    every subscriber has been attempted.
+
     Args:
         topic (bytes): the topic the message was sent to
-        data (file-like, readable, bytes): the message that was sent
+        data (file-like, readable, bytes; or bytes-like): the message that was
+            sent. bytes-like data is handed to aiohttp directly without copying
         config (Config): the broadcaster configuration to use
-        session (aiohttp.ClientSession): the aiohttp client session to
-            send requests to clients in
-        content_length (int): the length of the message in bytes. The stream
-            MUST not have more than this amount of data in it, as we will read
-            past this length if it does
+        session (aiohttp.ClientSession): the already open aiohttp client session
+            to send requests to clients in. the timeouts from the config are applied
+            per-request, so the session itself does not need to be configured
+        content_length (int): the length of the message in bytes. Exactly this
+            many bytes are sent from the current position of a file-like `data`
         sha512 (bytes): the sha512 hash of the content (64 bytes)
     """
-    succeeded = 0
-    attempted = 0
-    headers: Dict[str, str] = {
-        "Content-Type": "application/octet-stream",
-        "Content-Length": str(content_length),
-        "Repr-Digest": f"sha-512={base64.b64encode(sha512).decode('ascii')}",
-        "X-Topic": base64.b64encode(topic).decode("ascii"),
-    }
-
-    message_starts_at = data.tell()
-    guarded_request_body = CloseGuardedIO(data)
-
-    async for subscriber in config.get_subscribers(topic=topic):
-        if subscriber["type"] == "unavailable":
-            return TrustedNotifyResultUnavailable(
-                type=TrustedNotifyResultType.UNAVAILABLE,
-                partial_succeeded=succeeded,
-                partial_failed=attempted - succeeded,
+    # shared by every subscriber task, so it must never be mutated
+    base_headers: Mapping[str, str] = MappingProxyType(
+        {
+            hdrs.CONTENT_TYPE: "application/octet-stream",
+            hdrs.CONTENT_LENGTH: str(content_length),
+            _REPR_DIGEST: "sha-512="
+            + binascii.b2a_base64(sha512, newline=False).decode("ascii"),
+            _X_TOPIC: binascii.b2a_base64(topic, newline=False).decode("ascii"),
+        }
+    )
+
+    timeout = aiohttp.ClientTimeout(
+        total=config.outgoing_http_timeout_total,
+        connect=config.outgoing_http_timeout_connect,
+        sock_read=config.outgoing_http_timeout_sock_read,
+        sock_connect=config.outgoing_http_timeout_sock_connect,
+    )
+
+    max_concurrency = config.outgoing_http_max_concurrency
+    message_starts_at = 0
+    message_fd: Optional[int] = None
+    if not isinstance(data, (bytes, memoryview)):
+        message_starts_at = data.tell()
+        if hasattr(os, "pread") and isinstance(
+            data, (io.FileIO, io.BufferedReader, io.BufferedRandom)
+        ):
+            # positional reads share no seek state, so the file never has
+            # to be rewound between subscribers
+            data.flush()
+            message_fd = data.fileno()
+        else:
+            # every post shares the file position, so they cannot overlap
+            max_concurrency = 1
+
+    def get_post_data() -> _PostData:
+        if isinstance(data, (bytes, memoryview)):
+            return data
+        if message_fd is not None:
+            return _pread_chunks(message_fd, message_starts_at, content_length)
+        return _read_chunks(data, message_starts_at, content_length)
+
+    skip_authorization = is_outgoing_auth_noop(config)
+
+    semaphore = (
+        asyncio.Semaphore(max_concurrency) if max_concurrency is not None else None
+    )
+    loop = asyncio.get_running_loop()
+    auth_now = time.time()
+    refresh_auth_now_at = loop.time() + _AUTH_NOW_REFRESH_INTERVAL
+    tasks: List[asyncio.Task[bool]] = []
+    unavailable = False
+    try:
+        async for subscriber in config.get_subscribers(topic=topic):
+            if subscriber["type"] == "unavailable":
+                unavailable = True
+                break
+
+            if semaphore is not None:
+                await semaphore.acquire()
+
+            if not skip_authorization and loop.time() >= refresh_auth_now_at:
+                auth_now = time.time()
+                refresh_auth_now_at = loop.time() + _AUTH_NOW_REFRESH_INTERVAL
+
+            tasks.append(
+                asyncio.create_task(
+                    _notify_subscriber(
+                        subscriber,
+                        topic=topic,
+                        config=config,
+                        session=session,
+                        base_headers=base_headers,
+                        timeout=timeout,
+                        get_post_data=get_post_data,
+                        sha512=sha512,
+                        skip_authorization=skip_authorization,
+                        auth_now=auth_now,
+                        semaphore=semaphore,
+                    )
+                )
             )
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    # every subscriber is given the chance to finish before errors unrelated to
+    # reaching a particular subscriber (e.g., from the auth config) are raised
+    succeeded = 0
+    unexpected: List[BaseException] = []
+    for subscriber_result in await asyncio.gather(*tasks, return_exceptions=True):
+        if subscriber_result is True:
+            succeeded += 1
+        elif isinstance(subscriber_result, BaseException):
+            unexpected.append(subscriber_result)
+
+    if unexpected:
+        raise combine_multiple_exceptions(
+            f"multiple errors notifying subscribers about {topic!r}", unexpected
+        )
+
+    if unavailable:
+        return TrustedNotifyResultUnavailable(
+            type=TrustedNotifyResultType.UNAVAILABLE,
+            partial_succeeded=succeeded,
+            partial_failed=len(tasks) - succeeded,
+        )
+
+    return TrustedNotifyResultOK(
+        type=TrustedNotifyResultType.OK,
+        succeeded=succeeded,
+        failed=len(tasks) - succeeded,
+    )
+
+
+_PostData = Union[bytes, memoryview, AsyncIterator[bytes]]
 
-        attempted += 1
+
+async def _notify_subscriber(
+    subscriber: Union[SubscriberInfoExact, SubscriberInfoGlob],
+    /,
+    *,
+    topic: bytes,
+    config: Config,
+    session: aiohttp.ClientSession,
+    base_headers: Mapping[str, str],
+    timeout: aiohttp.ClientTimeout,
+    get_post_data: Callable[[], _PostData],
+    sha512: bytes,
+    skip_authorization: bool,
+    auth_now: float,
+    semaphore: Optional[asyncio.Semaphore],
+) -> bool:
+    """Posts the message to a single subscriber, unsubscribing them if they ask
+    us to, and releases the semaphore (if any) when done. Returns True if the
+    subscriber was reached, False if the request failed or timed out; other
+    errors propagate
+    """
+    try:
         url = subscriber["url"]
-        my_authorization = await config.setup_authorization(
-            url=url, topic=topic, message_sha512=sha512, now=time.time()
+        my_authorization = (
+            None
+            if skip_authorization
+            else await config.setup_authorization(
+                url=url, topic=topic, message_sha512=sha512, now=auth_now
+            )
+        )
+        headers = (
+            base_headers
+            if my_authorization is None
+            else {**base_headers, hdrs.AUTHORIZATION: my_authorization}
         )
-        if my_authorization is None:
-            headers.pop("Authorization", None)
-        else:
-            headers["Authorization"] = my_authorization
 
-        data.seek(message_starts_at)
         try:
             async with session.post(
                 url,
-                data=guarded_request_body,
+                data=get_post_data(),
                 headers=headers,
+                timeout=timeout,
             ) as resp:
                 if resp.ok:
                     logging.debug(f"Successfully notified {url} about {topic!r}")
-                    succeeded += 1
-                else:
-                    logging.warning(
-                        f"Failed to notify {url} about {topic!r}: {resp.status}"
-                    )
-
-                    if resp.status >= 400 and resp.status < 500:
-                        content_type = resp.headers.get("Content-Type")
-                        if content_type is not None and content_type.startswith(
-                            "application/json"
+                    return True
+
+                logging.warning(
+                    f"Failed to notify {url} about {topic!r}: {resp.status}"
+                )
+
+                if resp.status >= 400 and resp.status < 500:
+                    content_type = resp.headers.get("Content-Type")
+                    if content_type is not None and content_type.startswith(
+                        "application/json"
+                    ):
+                        content = await _read_small_json(resp)
+                        if (
+                            isinstance(content, dict)
+                            and content.get("unsubscribe") is True
                         ):
-                            content = await resp.json()
-                            if (
-                                isinstance(content, dict)
-                                and content.get("unsubscribe") is True
-                            ):
-                                logging.info(
-                                    f"Unsubscribing {url} from {topic!r} due to response: {json.dumps(content)}"
+                            logging.info(
+                                f"Unsubscribing {url} from {topic!r} due to response: {json.dumps(content)}"
+                            )
+
+                            if subscriber["type"] == "exact":
+                                await config.unsubscribe_exact(url=url, exact=topic)
+                            else:
+                                await config.unsubscribe_glob(
+                                    url=url, glob=subscriber["glob"]
                                 )
-
-                                if subscriber["type"] == "exact":
-                                    await config.unsubscribe_exact(url=url, exact=topic)
-                                else:
-                                    await config.unsubscribe_glob(
-                                        url=url, glob=subscriber["glob"]
-                                    )
-        except aiohttp.ClientError:
+                return False
+        except (aiohttp.ClientError, asyncio.TimeoutError):
             logging.error(f"Failed to notify {url} about {topic!r}", exc_info=True)
+            return False
+    finally:
+        if semaphore is not None:
+            semaphore.release()
 
-    return TrustedNotifyResultOK(
-        type=TrustedNotifyResultType.OK,
-        succeeded=succeeded,
-        failed=attempted - succeeded,
-    )
+
+async def _pread_chunks(fd: int, offset: int, length: int) -> AsyncIterator[bytes]:
+    """Yields exactly length bytes from the file descriptor starting at offset
+    without touching its file position
+    """
+    end = offset + length
+    while offset < end:
+        chunk = os.pread(fd, min(_READ_CHUNK_SIZE, end - offset), offset)
+        if not chunk:
+            raise ValueError(f"expected {end - offset} more bytes, got EOF")
+        offset += len(chunk)
+        yield chunk
+
+
+async def _read_chunks(
+    data: SyncIOBaseLikeIO, offset: int, length: int
+) -> AsyncIterator[bytes]:
+    """Seeks the file to offset, then yields exactly length bytes from it. Unlike
+    passing the file to aiohttp directly, the file is not closed afterwards
+    """
+    data.seek(offset)
+    remaining = length
+    while remaining > 0:
+        chunk = data.read(min(_READ_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError(f"expected {remaining} more bytes, got EOF")
+        remaining -= len(chunk)
+        yield chunk
+
+
+async def _read_small_json(resp: aiohttp.ClientResponse) -> Any:
+    """Parses the response body as json, returning None if it is not valid json or
+    is longer than we are willing to read for an error response
+    """
+    raw = bytearray()
+    while len(raw) <= _MAX_REJECTION_BODY_SIZE:
+        chunk = await resp.content.read(_MAX_REJECTION_BODY_SIZE + 1 - len(raw))
+        if not chunk:
+            break
+        raw.extend(chunk)
+
+    if len(raw) > _MAX_REJECTION_BODY_SIZE:
+        return None
+
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
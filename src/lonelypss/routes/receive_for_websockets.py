@@ -3,25 +3,23 @@ import hashlib
 import json
 import tempfile
 import time
-from typing import Annotated, Optional
+from typing import Optional
 
-from fastapi import APIRouter, Header, Request, Response
+from fastapi import APIRouter, Request, Response
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.middleware.config import get_config_from_request
 from lonelypss.middleware.ws_receiver import get_ws_receiver_from_request
+from lonelypss.util.openapi import optional_header_parameters
 
 router = APIRouter()
 
 
 @router.post(
     "/v1/receive_for_websockets",
+    openapi_extra=optional_header_parameters("authorization", "repr-digest", "x-topic"),
 )
-async def receive_for_websockets(
-    request: Request,
-    authorization: Annotated[Optional[str], Header()] = None,
-    repr_digest: Annotated[Optional[str], Header()] = None,
-    x_topic: Annotated[Optional[str], Header()] = None,
-) -> Response:
+async def receive_for_websockets(request: Request) -> Response:
     """As a broadcaster, in order to handle websocket connections, we need to be notified
     about messages that were sent to other broadcasters. To facilitate this, the broadcaster
     acts as a subscriber for itself, using this endpoint to receive messages, then forwards
@@ -32,6 +30,9 @@ async def receive_for_websockets(
     """
     config = get_config_from_request(request)
     receiver = get_ws_receiver_from_request(request)
+    authorization = request.headers.get("authorization")
+    repr_digest = request.headers.get("repr-digest")
+    x_topic = request.headers.get("x-topic")
 
     if repr_digest is None:
         return Response(
@@ -90,13 +91,16 @@ async def receive_for_websockets(
             content=b'{"unsubscribe": true, "reason": "unparseable sha-512 repr-digest (not base64)"}',
         )
 
-    auth_result = await config.is_receive_allowed(
-        url=str(request.url),
-        topic=topic,
-        message_sha512=expected_digest,
-        now=time.time(),
-        authorization=authorization,
-    )
+    if is_incoming_auth_allow_all(config):
+        auth_result = "ok"
+    else:
+        auth_result = await config.is_receive_allowed(
+            url=str(request.url),
+            topic=topic,
+            message_sha512=expected_digest,
+            now=time.time(),
+            authorization=authorization,
+        )
     if auth_result == "unavailable":
         return Response(status_code=503)
     if auth_result != "ok":
@@ -1,11 +1,11 @@
 import time
-from typing import Annotated, Optional
 
-from fastapi import APIRouter, Header, Request, Response
+from fastapi import APIRouter, Request, Response
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.middleware.config import get_config_from_request
-from lonelypss.util.async_io import async_read_exact
-from lonelypss.util.request_body_io import AsyncIterableAIO
+from lonelypss.util.openapi import optional_header_parameters
+from lonelypss.util.request_body_io import read_subscription_body
 
 router = APIRouter()
 
@@ -21,10 +21,9 @@ router = APIRouter()
         "500": {"description": "Unexpected error occurred"},
         "503": {"description": "Service is unavailable, try again soon"},
     },
+    openapi_extra=optional_header_parameters("authorization"),
 )
-async def unsubscribe_exact(
-    request: Request, authorization: Annotated[Optional[str], Header()] = None
-) -> Response:
+async def unsubscribe_exact(request: Request) -> Response:
     """Unsubscribes the given URL from the given glob. The body should be
     formatted as the following sequence:
 
@@ -45,30 +44,25 @@ async def unsubscribe_exact(
     - 503 Service Unavailable: servce (generally, database) is unavailable
     """
     config = get_config_from_request(request)
+    authorization = request.headers.get("authorization")
 
-    try:
-        stream = request.stream()
-        try:
-            body = AsyncIterableAIO(stream.__aiter__())
-
-            url_length_bytes = await async_read_exact(body, 2)
-            url_length = int.from_bytes(url_length_bytes, "big")
-            url_bytes = await async_read_exact(body, url_length)
-            url = url_bytes.decode("utf-8")
+    parsed = await read_subscription_body(request.stream())
+    if parsed is None:
+        return Response(status_code=400)
 
-            glob_length_bytes = await async_read_exact(body, 2)
-            glob_length = int.from_bytes(glob_length_bytes, "big")
-            glob_bytes = await async_read_exact(body, glob_length)
-            glob = glob_bytes.decode("utf-8")
-        finally:
-            await stream.aclose()
-    except ValueError:
+    url, glob_bytes = parsed
+    try:
+        glob = glob_bytes.decode("utf-8")
+    except UnicodeDecodeError:
         return Response(status_code=400)
 
-    auth_at = time.time()
-    auth_result = await config.is_subscribe_glob_allowed(
-        url=url, glob=glob, now=auth_at, authorization=authorization
-    )
+    if is_incoming_auth_allow_all(config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await config.is_subscribe_glob_allowed(
+            url=url, glob=glob, now=auth_at, authorization=authorization
+        )
 
     if auth_result == "unauthorized":
         return Response(status_code=401)
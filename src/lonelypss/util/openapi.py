@@ -0,0 +1,19 @@
+from typing import Any, Dict
+
+
+def optional_header_parameters(*names: str) -> Dict[str, Any]:
+    """Builds the `openapi_extra` for a route which reads the given optional headers
+    directly from the request rather than via FastAPI's `Header()` dependency, so that
+    they are still documented
+    """
+    return {
+        "parameters": [
+            {
+                "name": name,
+                "in": "header",
+                "required": False,
+                "schema": {"type": "string"},
+            }
+            for name in names
+        ]
+    }
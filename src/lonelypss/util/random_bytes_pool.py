@@ -0,0 +1,29 @@
+import secrets
+
+
+class RandomBytesPool:
+    """Hands out short random byte strings from a larger buffer which is drawn
+    from the operating system all at once, rather than asking the operating
+    system for every few bytes. Nothing is drawn until the first `take`, so
+    pools that are never used cost nothing
+    """
+
+    def __init__(self, pool_size: int = 4096) -> None:
+        self._pool_size = pool_size
+        self._buffer = b""
+        self._offset = pool_size
+
+    def take(self, n: int) -> bytes:
+        """Returns n random bytes that have not been returned before"""
+        if n > self._pool_size:
+            return secrets.token_bytes(n)
+
+        start = self._offset
+        end = start + n
+        if end > self._pool_size:
+            self._buffer = secrets.token_bytes(self._pool_size)
+            start = 0
+            end = n
+
+        self._offset = end
+        return self._buffer[start:end]
@@ -1,7 +1,20 @@
-from typing import TYPE_CHECKING, AsyncIterator, Type
+import struct
+from typing import (
+    TYPE_CHECKING,
+    AsyncGenerator,
+    AsyncIterator,
+    Optional,
+    Tuple,
+    Type,
+)
 
 from lonelypss.util.async_io import AsyncReadableBytesIO
 
+_UINT16 = struct.Struct(">H")
+
+_MAX_SUBSCRIPTION_BODY_LENGTH = 2 * (2 + 0xFFFF)
+"""No well-formed subscription body can be longer than two maximum-length fields"""
+
 
 class AsyncIterableAIO:
     """Adapts an AsyncIterable[bytes] to an asynchronous file-like object"""
@@ -32,5 +45,59 @@ class AsyncIterableAIO:
         return result
 
 
+async def read_bounded_body(
+    stream: AsyncGenerator[bytes, None], max_length: int
+) -> Optional[bytearray]:
+    """Reads the remainder of the stream into memory and closes it, returning None
+    instead if it contains more than max_length bytes
+    """
+    try:
+        body = bytearray()
+        async for chunk in stream:
+            body.extend(chunk)
+            if len(body) > max_length:
+                return None
+        return body
+    finally:
+        await stream.aclose()
+
+
+async def read_subscription_body(
+    stream: AsyncGenerator[bytes, None],
+) -> Optional[Tuple[str, bytes]]:
+    """Reads the body shared by the subscribe and unsubscribe routes and closes
+    the stream, returning the url and the topic or glob, or None if the body is
+    not formatted correctly. The body is formatted as follows:
+
+    - 2 bytes (N): the length of the url, big-endian, unsigned
+    - N bytes: the url. must be valid utf-8
+    - 2 bytes (M): the length of the topic or glob, big-endian, unsigned
+    - M bytes: the topic or glob
+    """
+    # the body is only two short length-prefixed fields, so it is buffered
+    # once and parsed in place
+    body = await read_bounded_body(stream, _MAX_SUBSCRIPTION_BODY_LENGTH)
+    if body is None:
+        return None
+
+    try:
+        (url_length,) = _UINT16.unpack_from(body, 0)
+        (field_length,) = _UINT16.unpack_from(body, 2 + url_length)
+    except struct.error:
+        return None
+
+    field_starts_at = 2 + url_length + 2
+    field_ends_at = field_starts_at + field_length
+    if len(body) < field_ends_at:
+        return None
+
+    try:
+        url = body[2 : 2 + url_length].decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+    return url, bytes(body[field_starts_at:field_ends_at])
+
+
 if TYPE_CHECKING:
     _: Type[AsyncReadableBytesIO] = AsyncIterableAIO
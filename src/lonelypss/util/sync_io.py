@@ -1,5 +1,6 @@
+import tempfile
 from io import BytesIO, FileIO
-from typing import TYPE_CHECKING, Protocol, Type, Union
+from typing import IO, TYPE_CHECKING, Callable, Protocol, Type, Union
 
 
 class SyncReadableBytesIOA(Protocol):
@@ -21,7 +22,7 @@ class SyncReadableBytesIOB(Protocol):
 class SyncWritableBytesIO(Protocol):
     """A type that represents a stream that can be written synchronously"""
 
-    def write(self, b: Union[bytes, bytearray], /) -> int:
+    def write(self, b: Union[bytes, bytearray, memoryview], /) -> int:
         """Writes the given bytes to the file-like object"""
         raise NotImplementedError()
 
@@ -37,6 +38,39 @@ def read_exact(stream: SyncReadableBytesIO, n: int) -> bytes:
     return result
 
 
+def make_chunk_reader(
+    stream: SyncReadableBytesIO, max_chunk_size: int
+) -> Callable[[int], Union[bytes, memoryview]]:
+    """Returns a function which reads up to n bytes from the stream, where n is
+    at most max_chunk_size. When the stream supports readinto, every chunk is read
+    into the same buffer rather than allocating a new bytes object, so each result
+    is only valid until the next call
+    """
+    readinto = getattr(stream, "readinto", None)
+    if readinto is None:
+        return stream.read
+
+    buffer = memoryview(bytearray(max_chunk_size))
+
+    def read_chunk(n: int) -> memoryview:
+        return buffer[: readinto(buffer[:n]) or 0]
+
+    return read_chunk
+
+
+def make_spool_for_length(length: int, spool_size: int) -> IO[bytes]:
+    """Creates a temporary file for storing a body whose final length is already
+    known. If it fits within spool_size this is a plain in-memory buffer, since
+    it will never need to roll over and a spooled file would only add overhead
+    to every write. Otherwise it is on disk from the start, since a spooled file
+    would first fill spool_size bytes of memory only to copy them out when it
+    rolled over
+    """
+    if length > spool_size:
+        return tempfile.TemporaryFile()
+    return BytesIO()
+
+
 class Closeable(Protocol):
     """Represents something that can be closed"""
 
@@ -135,7 +169,7 @@ class VoidSyncIO:
     def read(self, n: int) -> bytes:
         return b""
 
-    def write(self, b: Union[bytes, bytearray], /) -> int:
+    def write(self, b: Union[bytes, bytearray, memoryview], /) -> int:
         return len(b)
 
     def tell(self) -> int:
@@ -1,3 +1,5 @@
+from typing import Union
+
 from lonelypsp.stateful.constants import BroadcasterToSubscriberStatefulMessageType
 from lonelypsp.stateful.messages.enable_zstd_custom import (
     B2S_EnableZstdCustom,
@@ -8,9 +10,48 @@ from lonelypsp.stateful.messages.enable_zstd_preset import (
     serialize_b2s_enable_zstd_preset,
 )
 
+from lonelypss.config.config import Config
 from lonelypss.ws.handlers.open.check_result import CheckResult
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
-from lonelypss.ws.state import CompressorState, StateOpen
+from lonelypss.ws.state import CompressorReady, CompressorState, StateOpen
+
+
+def serialize_enable_compressor(
+    config: Config, compressor: CompressorReady
+) -> Union[bytes, bytearray]:
+    """Serializes the message that tells the subscriber it may use the given
+    compressor, which must be sent once it is ready
+    """
+    if compressor.identifier < 65536:
+        return serialize_b2s_enable_zstd_preset(
+            B2S_EnableZstdPreset(
+                type=BroadcasterToSubscriberStatefulMessageType.ENABLE_ZSTD_PRESET,
+                identifier=compressor.identifier,
+                compression_level=compressor.level,
+                min_size=(
+                    config.compression_min_size
+                    if compressor.identifier != 1
+                    else config.compression_trained_max_size
+                ),
+                max_size=2**64 - 1,
+            ),
+            minimal_headers=config.websocket_minimal_headers,
+        )
+
+    assert (
+        compressor.data is not None
+    ), f"compressor identifier {compressor.identifier}>=2**16 must have data"
+    return serialize_b2s_enable_zstd_custom(
+        B2S_EnableZstdCustom(
+            type=BroadcasterToSubscriberStatefulMessageType.ENABLE_ZSTD_CUSTOM,
+            identifier=compressor.identifier,
+            compression_level=compressor.level,
+            min_size=config.compression_min_size,
+            max_size=config.compression_trained_max_size,
+            dictionary=compressor.data.as_bytes(),
+        ),
+        minimal_headers=config.websocket_minimal_headers,
+    )
 
 
 async def check_compressors(state: StateOpen) -> CheckResult:
@@ -28,42 +69,10 @@ async def check_compressors(state: StateOpen) -> CheckResult:
             new_compressor = compressor.task.result()
             state.compressors[idx] = new_compressor
 
-            if new_compressor.identifier < 65536:
-                send_simple_asap(
-                    state,
-                    serialize_b2s_enable_zstd_preset(
-                        B2S_EnableZstdPreset(
-                            type=BroadcasterToSubscriberStatefulMessageType.ENABLE_ZSTD_PRESET,
-                            identifier=new_compressor.identifier,
-                            compression_level=new_compressor.level,
-                            min_size=(
-                                state.broadcaster_config.compression_min_size
-                                if new_compressor.identifier != 1
-                                else state.broadcaster_config.compression_trained_max_size
-                            ),
-                            max_size=2**64 - 1,
-                        ),
-                        minimal_headers=state.broadcaster_config.websocket_minimal_headers,
-                    ),
-                )
-            else:
-                assert (
-                    new_compressor.data is not None
-                ), f"compressor identifier {compressor.identifier}>=2**16 must have data"
-                send_simple_asap(
-                    state,
-                    serialize_b2s_enable_zstd_custom(
-                        B2S_EnableZstdCustom(
-                            type=BroadcasterToSubscriberStatefulMessageType.ENABLE_ZSTD_CUSTOM,
-                            identifier=new_compressor.identifier,
-                            compression_level=new_compressor.level,
-                            min_size=state.broadcaster_config.compression_min_size,
-                            max_size=state.broadcaster_config.compression_trained_max_size,
-                            dictionary=new_compressor.data.as_bytes(),
-                        ),
-                        minimal_headers=state.broadcaster_config.websocket_minimal_headers,
-                    ),
-                )
+            send_simple_asap(
+                state,
+                serialize_enable_compressor(state.broadcaster_config, new_compressor),
+            )
 
             did_something = True
 
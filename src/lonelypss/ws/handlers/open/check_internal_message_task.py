@@ -1,12 +1,17 @@
 import asyncio
 import io
+import os
+import stat
+import sys
 import tempfile
-from typing import Union
+from typing import BinaryIO, Union
 
+from lonelypss.util.sync_io import make_chunk_reader
 from lonelypss.ws.handlers.open.check_result import CheckResult
 from lonelypss.ws.handlers.open.senders.send_any import send_any
 from lonelypss.ws.state import (
     InternalLargeMessage,
+    InternalMessage,
     InternalMessageType,
     InternalSmallMessage,
     StateOpen,
@@ -24,12 +29,17 @@ async def check_internal_message_task(state: StateOpen) -> CheckResult:
         return CheckResult.CONTINUE
 
     result = state.internal_message_task.result()
-    state.internal_message_task = asyncio.create_task(state.my_receiver.queue.get())
+    state.internal_message_task = _next_internal_message(state)
 
     if state.send_task is None and not state.unsent_messages:
         state.send_task = asyncio.create_task(send_any(state, result))
         return CheckResult.RESTART
 
+    if len(state.unsent_messages) == state.unsent_messages.maxlen:
+        if result.type == InternalMessageType.LARGE:
+            result.finished.set()
+        raise Exception("too many unsent messages")
+
     if result.type != InternalMessageType.LARGE:
         state.unsent_messages.append(result)
         return CheckResult.RESTART
@@ -39,6 +49,22 @@ async def check_internal_message_task(state: StateOpen) -> CheckResult:
     return CheckResult.RESTART
 
 
+def _next_internal_message(state: StateOpen) -> "asyncio.Future[InternalMessage]":
+    """Returns a future for the next message on my_receiver.queue. If one is
+    already waiting it is taken immediately and wrapped in a completed future,
+    which is much cheaper than scheduling a task just to dequeue it
+    """
+    queue = state.my_receiver.queue
+    if queue.empty():
+        return asyncio.create_task(queue.get())
+
+    result: "asyncio.Future[InternalMessage]" = (
+        asyncio.get_running_loop().create_future()
+    )
+    result.set_result(queue.get_nowait())
+    return result
+
+
 def _spool_large_message(
     state: StateOpen, message: InternalLargeMessage
 ) -> Union[InternalSmallMessage, WaitingInternalSpooledLargeMessage]:
@@ -71,17 +97,21 @@ def _spool_large_message(
 
     tmpfile = tempfile.TemporaryFile()
     try:
-        remaining = message.length
-        while remaining > 0:
-            chunk = message.stream.read(min(io.DEFAULT_BUFFER_SIZE, remaining))
-            if not chunk:
-                raise ValueError(f"unexpected end of stream ({remaining} bytes left)")
-
-            tmpfile.write(chunk)
-            remaining -= len(chunk)
-
-        if remaining < 0:
-            raise ValueError(f"read too many bytes ({remaining} left)")
+        if not _copy_with_sendfile(message.stream, tmpfile, message.length):
+            read_chunk = make_chunk_reader(message.stream, io.DEFAULT_BUFFER_SIZE)
+            remaining = message.length
+            while remaining > 0:
+                chunk = read_chunk(min(io.DEFAULT_BUFFER_SIZE, remaining))
+                if not chunk:
+                    raise ValueError(
+                        f"unexpected end of stream ({remaining} bytes left)"
+                    )
+
+                tmpfile.write(chunk)
+                remaining -= len(chunk)
+
+            if remaining < 0:
+                raise ValueError(f"read too many bytes ({remaining} left)")
 
         tmpfile.seek(0)
         return WaitingInternalSpooledLargeMessage(
@@ -96,3 +126,51 @@ def _spool_large_message(
         raise
     finally:
         message.finished.set()
+
+
+def _copy_with_sendfile(source: object, target: BinaryIO, length: int) -> bool:
+    """If the source is backed by a regular file, copies the next length bytes
+    from it to the (empty) target within the kernel via os.sendfile, leaving the
+    source positioned just after them, and returns True. Otherwise, does nothing
+    and returns False so the caller can copy through python instead.
+
+    A SpooledTemporaryFile which is still in memory is left alone, as asking for
+    its fileno would force it onto disk.
+    """
+    if sys.platform != "linux":
+        return False
+
+    if isinstance(source, io.BytesIO):
+        return False
+
+    if isinstance(source, tempfile.SpooledTemporaryFile):
+        # the name is only set once it has rolled over to a real file
+        if getattr(source, "name", None) is None:
+            return False
+    elif not isinstance(source, io.IOBase):
+        return False
+
+    try:
+        source_fd = source.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return False
+
+    if not stat.S_ISREG(os.fstat(source_fd).st_mode):
+        return False
+
+    # anything buffered for writing must reach the file before the kernel reads it
+    source.flush()
+    target_fd = target.fileno()
+    # sendfile with an explicit offset does not move the source descriptor, so
+    # the buffered position stays authoritative and is updated afterwards
+    offset = source.tell()
+    remaining = length
+    while remaining > 0:
+        sent = os.sendfile(target_fd, source_fd, offset, remaining)
+        if sent == 0:
+            raise ValueError(f"unexpected end of stream ({remaining} bytes left)")
+        offset += sent
+        remaining -= sent
+
+    source.seek(offset)
+    return True
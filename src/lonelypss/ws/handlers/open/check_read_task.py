@@ -1,10 +1,14 @@
 import asyncio
-import io
-from typing import cast
+from typing import Any, Callable, Dict, cast
 
-from lonelypsp.stateful.constants import SubscriberToBroadcasterStatefulMessageType
+from lonelypsp.stateful.constants import (
+    PubSubStatefulMessageFlags,
+    SubscriberToBroadcasterStatefulMessageType,
+)
+from lonelypsp.stateful.message import S2B_Message
+from lonelypsp.stateful.messages.confirm_receive import S2B_ConfirmReceive
+from lonelypsp.stateful.messages.continue_receive import S2B_ContinueReceive
 from lonelypsp.stateful.parser import S2B_AnyMessageParser
-from lonelypsp.stateful.parser_helpers import parse_s2b_message_prefix
 
 from lonelypss.util.websocket_message import WSMessageBytes
 from lonelypss.ws.handlers.open.check_result import CheckResult
@@ -13,7 +17,49 @@ from lonelypss.ws.handlers.open.processors.processor import process_any
 from lonelypss.ws.state import (
     StateOpen,
 )
-from lonelypss.ws.util import make_websocket_read_task
+from lonelypss.ws.util import (
+    make_websocket_read_task,
+    parse_s2b_minimal_ack,
+    parse_s2b_payload_prefix,
+)
+
+
+def _handle_confirm_receive(state: StateOpen, message: S2B_ConfirmReceive) -> None:
+    expected_ack = state.expecting_acks.get_nowait()
+    if expected_ack.type != message.type:
+        raise Exception(f"unexpected confirm receive (expecting a {expected_ack.type})")
+    if expected_ack.identifier != message.identifier:
+        raise Exception(
+            f"unexpected confirm receive (expecting identifier {expected_ack.identifier!r}, got {message.identifier!r})"
+        )
+
+
+def _handle_continue_receive(state: StateOpen, message: S2B_ContinueReceive) -> None:
+    expected_ack = state.expecting_acks.get_nowait()
+    if expected_ack.type != message.type:
+        raise Exception(
+            f"unexpected continue receive (expecting a {expected_ack.type})"
+        )
+    if expected_ack.identifier != message.identifier:
+        raise Exception(
+            f"unexpected continue receive (expecting identifier {expected_ack.identifier!r}, got {message.identifier!r})"
+        )
+    if expected_ack.part_id != message.part_id:
+        raise Exception(
+            f"unexpected continue receive (expecting part_id {expected_ack.part_id}, got {message.part_id})"
+        )
+
+
+_ACK_HANDLERS: Dict[
+    SubscriberToBroadcasterStatefulMessageType, Callable[[StateOpen, Any], None]
+] = {
+    SubscriberToBroadcasterStatefulMessageType.CONFIRM_RECEIVE: _handle_confirm_receive,
+    SubscriberToBroadcasterStatefulMessageType.CONTINUE_RECEIVE: _handle_continue_receive,
+}
+"""acks are common and can be handled synchronously, so they are fast tracked
+rather than going through the process task. these are also exactly the message
+types that parse_s2b_minimal_ack can handle
+"""
 
 
 async def check_read_task(state: StateOpen) -> CheckResult:
@@ -32,46 +78,29 @@ async def check_read_task(state: StateOpen) -> CheckResult:
         raise Exception("unexpected message type (expected bytes)")
 
     payload = cast(WSMessageBytes, result)["bytes"]
-    payload_reader = io.BytesIO(payload)
-    prefix = parse_s2b_message_prefix(payload_reader)
+    prefix, payload_reader = parse_s2b_payload_prefix(payload)
     if prefix.type == SubscriberToBroadcasterStatefulMessageType.CONFIGURE:
         raise ValueError("already configured")
 
-    message = S2B_AnyMessageParser.parse(prefix.flags, prefix.type, payload_reader)
+    message: S2B_Message
+    if (
+        prefix.flags & PubSubStatefulMessageFlags.MINIMAL_HEADERS
+    ) != 0 and prefix.type in _ACK_HANDLERS:
+        message = parse_s2b_minimal_ack(prefix.type, payload)
+    else:
+        message = S2B_AnyMessageParser.parse(prefix.flags, prefix.type, payload_reader)
     state.read_task = make_websocket_read_task(state.websocket)
 
-    # fast track acks as they are common and can be handled synchronously
-    if message.type == SubscriberToBroadcasterStatefulMessageType.CONFIRM_RECEIVE:
-        expected_ack = state.expecting_acks.get_nowait()
-        if expected_ack.type != message.type:
-            raise Exception(
-                f"unexpected confirm receive (expecting a {expected_ack.type})"
-            )
-        if expected_ack.identifier != message.identifier:
-            raise Exception(
-                f"unexpected confirm receive (expecting identifier {expected_ack.identifier!r}, got {message.identifier!r})"
-            )
-        return CheckResult.RESTART
-
-    if message.type == SubscriberToBroadcasterStatefulMessageType.CONTINUE_RECEIVE:
-        expected_ack = state.expecting_acks.get_nowait()
-        if expected_ack.type != message.type:
-            raise Exception(
-                f"unexpected continue receive (expecting a {expected_ack.type})"
-            )
-        if expected_ack.identifier != message.identifier:
-            raise Exception(
-                f"unexpected continue receive (expecting identifier {expected_ack.identifier!r}, got {message.identifier!r})"
-            )
-        if expected_ack.part_id != message.part_id:
-            raise Exception(
-                f"unexpected continue receive (expecting part_id {expected_ack.part_id}, got {message.part_id})"
-            )
+    ack_handler = _ACK_HANDLERS.get(message.type)
+    if ack_handler is not None:
+        ack_handler(state, message)
         return CheckResult.RESTART
 
     if state.process_task is None:
         state.process_task = asyncio.create_task(process_any(state, message))
     else:
+        if len(state.unprocessed_messages) == state.unprocessed_messages.maxlen:
+            raise Exception("too many unprocessed messages")
         state.unprocessed_messages.append(message)
 
     return CheckResult.RESTART
@@ -1,9 +1,10 @@
 import asyncio
 import os
+import struct
 import tempfile
 import time
 from types import TracebackType
-from typing import TYPE_CHECKING, List, Optional, Protocol, Tuple, Type
+from typing import TYPE_CHECKING, List, Optional, Protocol, Tuple, Type, Union
 
 from lonelypss.util.sync_io import read_exact
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
@@ -30,6 +31,15 @@ except ImportError:
     ...
 
 
+_SAMPLE_LENGTH = struct.Struct(">I")
+"""the length prefix before each sample in the collector tmpfile"""
+
+_YIELD_INTERVAL = 0.001
+"""How long in seconds we will load training samples without yielding to the
+event loop
+"""
+
+
 class _ConfigCompressorGenerator(Protocol):
     """
     type that describes
@@ -77,20 +87,29 @@ async def make_ready_compressor_from_collector_and_generator(
         )
         collector.pending.add(our_event)
 
-        await asyncio.wait(writing_to_usable, return_when=asyncio.ALL_COMPLETED)
-        for wait in writing_to_usable:
-            wait.result()
+        if writing_to_usable:
+            await asyncio.wait(writing_to_usable, return_when=asyncio.ALL_COMPLETED)
+            for wait in writing_to_usable:
+                wait.result()
 
+        # other connections may append to the collector whenever we yield, so
+        # we seek before every sample and only read up to the end of the last
+        # usable one, yielding to the event loop whenever our time budget runs out
         samples: List[bytes] = []
         pos = 0
+        loop = asyncio.get_running_loop()
+        yield_at = loop.time() + _YIELD_INTERVAL
         while len(samples) < usable_num_messages:
             collector.tmpfile.seek(pos, os.SEEK_SET)
-            sample_len_bytes = read_exact(collector.tmpfile, 4)
-            sample_len = int.from_bytes(sample_len_bytes, "big")
-            sample = read_exact(collector.tmpfile, sample_len)
-            samples.append(sample)
-            pos += 4 + sample_len
-            await asyncio.sleep(0)
+            (sample_len,) = _SAMPLE_LENGTH.unpack(
+                read_exact(collector.tmpfile, _SAMPLE_LENGTH.size)
+            )
+            samples.append(read_exact(collector.tmpfile, sample_len))
+            pos += _SAMPLE_LENGTH.size + sample_len
+
+            if loop.time() >= yield_at:
+                await asyncio.sleep(0)
+                yield_at = loop.time() + _YIELD_INTERVAL
 
         our_event.set()
         collector.pending.discard(our_event)
@@ -307,7 +326,7 @@ def maybe_store_small_message_for_training(state: StateOpen, data: bytes) -> Non
 
     try:
         collector.tmpfile.seek(0, os.SEEK_END)
-        collector.tmpfile.write(len(data).to_bytes(4, "big"))
+        collector.tmpfile.write(_SAMPLE_LENGTH.pack(len(data)))
         collector.tmpfile.write(data)
     except BaseException:
         collector.tmpfile.close()
@@ -342,7 +361,13 @@ class CompressorLargeMessageWriter(Protocol):
     def raise_if_not_done(self) -> None:
         """cleans up and raises an error if remaining is not zero"""
 
-    def write_chunk(self, data: bytes) -> None:
+    def abort(self) -> None:
+        """Gives up on writing the rest of the message, releasing the collector
+        so it no longer waits on this writer. Safe to call more than once or
+        after the message was fully written
+        """
+
+    def write_chunk(self, data: Union[bytes, memoryview]) -> None:
         """Writes a chunk of the message to the collector. If this is
         the last chunk, cleans up resources. To check if this was the
         last chunk, remaining will be zero
@@ -373,7 +398,9 @@ class VoidingCompressorLargeMessageWriter:
         if self.remaining != 0:
             raise ValueError("not done writing")
 
-    def write_chunk(self, data: bytes) -> None:
+    def abort(self) -> None: ...
+
+    def write_chunk(self, data: Union[bytes, memoryview]) -> None:
         if self.remaining < len(data):
             raise ValueError("too much data")
         self.remaining -= len(data)
@@ -406,13 +433,13 @@ class _RealCompressorLargeMessageWriter:
 
         try:
             self._pos = collector.tmpfile.seek(0, os.SEEK_END)
-            collector.tmpfile.write(length.to_bytes(4, "big"))
+            collector.tmpfile.write(_SAMPLE_LENGTH.pack(length))
         except BaseException:
             self._cleanup()
             collector.tmpfile.close()
             raise
 
-        self._pos += 4
+        self._pos += _SAMPLE_LENGTH.size
 
         if length == 0:
             self._cleanup()
@@ -425,7 +452,10 @@ class _RealCompressorLargeMessageWriter:
             self._cleanup()
             raise ValueError("not done writing")
 
-    def write_chunk(self, data: bytes) -> None:
+    def abort(self) -> None:
+        self._cleanup()
+
+    def write_chunk(self, data: Union[bytes, memoryview]) -> None:
         if self.remaining < len(data):
             self._cleanup()
             raise ValueError("too much data")
@@ -28,6 +28,7 @@ from lonelypss.ws.state import (
     WaitingInternalMessage,
     WaitingInternalMessageType,
 )
+from lonelypss.ws.util import wait_first_completed
 
 
 async def handle_open(state: State) -> State:
@@ -59,7 +60,7 @@ async def handle_open(state: State) -> State:
             if await check_compressors(state) == CheckResult.RESTART:
                 return state
 
-            await asyncio.wait(
+            await wait_first_completed(
                 [
                     *([state.send_task] if state.send_task is not None else []),
                     state.internal_message_task,
@@ -71,8 +72,7 @@ async def handle_open(state: State) -> State:
                         for compressor in state.compressors
                         if compressor.type == CompressorState.PREPARING
                     ],
-                ],
-                return_when=asyncio.FIRST_COMPLETED,
+                ]
             )
             return state
         except NormalDisconnectException:
@@ -129,6 +129,8 @@ async def handle_open(state: State) -> State:
             except BaseException as e2:
                 cleanup_exceptions.append(e2)
 
+            state.notify_stream_state.training_writer.abort()
+
         if state.send_task is not None:
             state.send_task.cancel()
 
@@ -187,7 +189,7 @@ async def _disconnect_receiver(state: StateOpen) -> None:
         except BaseException as e:
             excs.append(e)
 
-    for _, glob in state.my_receiver.glob_subscriptions:
+    for glob in state.my_receiver.glob_subscriptions:
         try:
             await state.internal_receiver.decrement_glob(glob)
         except BaseException as e:
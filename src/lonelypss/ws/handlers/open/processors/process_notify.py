@@ -1,7 +1,6 @@
 import asyncio
 import hashlib
 import io
-import tempfile
 import time
 
 from lonelypsp.stateful.constants import BroadcasterToSubscriberStatefulMessageType
@@ -11,7 +10,9 @@ from lonelypsp.stateful.messages.confirm_notify import (
 )
 from lonelypsp.stateful.messages.notify import S2B_Notify
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.routes.notify import TrustedNotifyResultType, handle_trusted_notify
+from lonelypss.util.sync_io import make_spool_for_length
 from lonelypss.ws.handlers.open.collector_utils import (
     maybe_store_small_message_for_training,
     maybe_write_large_message_for_training,
@@ -21,22 +22,59 @@ from lonelypss.ws.handlers.open.errors import AuthRejectedException
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
 from lonelypss.ws.state import CompressorState, StateOpen
 
+try:
+    import zstandard
+except ImportError:
+    ...
+
+_YIELD_INTERVAL = 0.001
+"""How long in seconds we will decompress without yielding to the event loop"""
+
+_THREAD_DECOMPRESSION_MIN_SIZE = 64 * 1024
+"""The smallest in-memory decompressed message we decompress in a worker thread
+rather than on the event loop; below this the thread handoff costs more than it
+saves
+"""
+
+_THREAD_HASH_MIN_SIZE = 64 * 1024
+"""The smallest in-memory decompressed message we hash in a worker thread rather
+than on the event loop; below this the thread handoff costs more than it saves
+"""
+
+
+def _frame_fits_declared_length(compressed: bytes, decompressed_length: int) -> bool:
+    """True if decompressing the frame in one call is bounded by the declared
+    length. zstandard sizes the output from the content size in the frame header
+    when present, ignoring max_output_size, so a frame declaring more than the
+    subscriber did must go through the incremental reader, which stops as soon
+    as the declared length is exceeded
+    """
+    try:
+        content_size = zstandard.frame_content_size(compressed)
+    except zstandard.ZstdError:
+        return False
+
+    return content_size == -1 or content_size == decompressed_length
+
 
 async def process_notify(state: StateOpen, message: S2B_Notify) -> None:
     """Processes a request by the subscriber to notify subscribers to a given
     topic with the given data
     """
-    auth_at = time.time()
-    auth_result = await state.broadcaster_config.is_notify_allowed(
-        topic=message.topic,
-        message_sha512=(
-            message.verified_compressed_sha512
-            if message.compressor_id is not None
-            else message.verified_uncompressed_sha512
-        ),
-        now=auth_at,
-        authorization=message.authorization,
-    )
+    if is_incoming_auth_allow_all(state.broadcaster_config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await state.broadcaster_config.is_notify_allowed(
+            topic=message.topic,
+            message_sha512=(
+                message.verified_compressed_sha512
+                if message.compressor_id is not None
+                else message.verified_uncompressed_sha512
+            ),
+            now=auth_at,
+            authorization=message.authorization,
+        )
 
     if auth_result != "ok":
         raise AuthRejectedException(f"notify: {auth_result}")
@@ -45,7 +83,7 @@ async def process_notify(state: StateOpen, message: S2B_Notify) -> None:
         maybe_store_small_message_for_training(state, message.uncompressed_message)
         notify_result = await handle_trusted_notify(
             message.topic,
-            io.BytesIO(message.uncompressed_message),
+            message.uncompressed_message,
             config=state.broadcaster_config,
             session=state.client_session,
             content_length=len(message.uncompressed_message),
@@ -81,51 +119,110 @@ async def process_notify(state: StateOpen, message: S2B_Notify) -> None:
     # although the compressed data fits in memory, we may not want to have the
     # entire uncompressed data in memory. it would neat and efficient to simply
     # decompress in parts as we are notifying subscribers, but is a bit
-    # challenging to implement
-
-    with (
-        tempfile.SpooledTemporaryFile(
-            max_size=state.broadcaster_config.message_body_spool_size
-        ) as decompressed_file,
-    ):
+    # challenging to implement. when it is small enough to keep in memory, though,
+    # we decompress straight into its final buffer rather than a spooled file
+    decompressed_length = message.decompressed_length
+    in_memory = decompressed_length <= state.broadcaster_config.message_body_spool_size
+
+    with make_spool_for_length(
+        decompressed_length, state.broadcaster_config.message_body_spool_size
+    ) as decompressed_file:
         pos = 0
         hasher = hashlib.sha512()
 
         with (
             maybe_write_large_message_for_training(
-                state, message.decompressed_length
+                state, decompressed_length
             ) as training_writer,
             reserve_decompressor(state, compressor) as reserved_decompressor,
-            reserved_decompressor.stream_reader(message.compressed_message) as streamer,
         ):
-            while True:
-                chunk = streamer.read(io.DEFAULT_BUFFER_SIZE)
-                if not chunk:
-                    break
-                pos += len(chunk)
-                if pos > message.decompressed_length:
-                    raise ValueError(
-                        "decompressed length exceeded during decompression"
+            if (
+                in_memory
+                and decompressed_length > 0
+                and training_writer.is_void
+                and _frame_fits_declared_length(
+                    message.compressed_message, decompressed_length
+                )
+            ):
+                # nothing needs the data as it is produced, so zstandard can
+                # decompress it in one call, which releases the GIL
+                training_writer.skip_void()
+                if decompressed_length >= _THREAD_DECOMPRESSION_MIN_SIZE:
+                    decompressed = await asyncio.to_thread(
+                        reserved_decompressor.decompress,
+                        message.compressed_message,
+                        max_output_size=decompressed_length,
                     )
-
-                decompressed_file.write(chunk)
-                training_writer.write_chunk(chunk)
-                hasher.update(chunk)
-
-                await asyncio.sleep(0)
-
-        if pos != message.decompressed_length:
+                else:
+                    decompressed = reserved_decompressor.decompress(
+                        message.compressed_message,
+                        max_output_size=decompressed_length,
+                    )
+                decompressed_view = memoryview(decompressed)
+                pos = len(decompressed_view)
+            else:
+                decompressed_view = memoryview(
+                    bytearray(decompressed_length if in_memory else 0)
+                )
+                with reserved_decompressor.stream_reader(
+                    message.compressed_message
+                ) as streamer:
+                    buffer = memoryview(
+                        bytearray(0 if in_memory else io.DEFAULT_BUFFER_SIZE)
+                    )
+                    loop = asyncio.get_running_loop()
+                    yield_at = loop.time() + _YIELD_INTERVAL
+                    while True:
+                        if in_memory:
+                            if pos == decompressed_length:
+                                if streamer.read(1):
+                                    raise ValueError(
+                                        "decompressed length exceeded during decompression"
+                                    )
+                                break
+                            target = decompressed_view[
+                                pos : pos + io.DEFAULT_BUFFER_SIZE
+                            ]
+                            chunk = target[: streamer.readinto(target)]
+                        else:
+                            chunk = buffer[: streamer.readinto(buffer)]
+                        if not chunk:
+                            break
+                        pos += len(chunk)
+                        if pos > decompressed_length:
+                            raise ValueError(
+                                "decompressed length exceeded during decompression"
+                            )
+
+                        if not in_memory:
+                            decompressed_file.write(chunk)
+                            hasher.update(chunk)
+                        training_writer.write_chunk(chunk)
+
+                        if loop.time() >= yield_at:
+                            await asyncio.sleep(0)
+                            yield_at = loop.time() + _YIELD_INTERVAL
+
+        if pos != decompressed_length:
             raise ValueError("decompressed length not reached during decompression")
 
+        if in_memory:
+            # hashing the final buffer in one call is much cheaper than many
+            # small updates, and hashlib releases the GIL while doing so
+            if decompressed_length >= _THREAD_HASH_MIN_SIZE:
+                await asyncio.to_thread(hasher.update, decompressed_view)
+            else:
+                hasher.update(decompressed_view)
+
         decompressed_sha512 = hasher.digest()
         decompressed_file.seek(0)
 
         notify_result = await handle_trusted_notify(
             message.topic,
-            decompressed_file,
+            decompressed_view if in_memory else decompressed_file,
             config=state.broadcaster_config,
             session=state.client_session,
-            content_length=message.decompressed_length,
+            content_length=decompressed_length,
             sha512=decompressed_sha512,
         )
         if notify_result.type != TrustedNotifyResultType.OK:
@@ -2,11 +2,14 @@ import asyncio
 import dataclasses
 import hashlib
 import io
-import tempfile
+import struct
 import time
-from typing import IO, cast
+from typing import IO, Optional, Union, cast
 
-from lonelypsp.stateful.constants import BroadcasterToSubscriberStatefulMessageType
+from lonelypsp.stateful.constants import (
+    BroadcasterToSubscriberStatefulMessageType,
+    PubSubStatefulMessageFlags,
+)
 from lonelypsp.stateful.messages.confirm_notify import (
     B2S_ConfirmNotify,
     serialize_b2s_confirm_notify,
@@ -16,15 +19,114 @@ from lonelypsp.stateful.messages.continue_notify import (
     serialize_b2s_continue_notify,
 )
 from lonelypsp.stateful.messages.notify_stream import S2B_NotifyStream
+from lonelypsp.stateful.serializer_helpers import int_to_minimal_unsigned
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.routes.notify import TrustedNotifyResultType, handle_trusted_notify
+from lonelypss.util.sync_io import SyncIOBaseLikeIO, make_spool_for_length
 from lonelypss.ws.handlers.open.collector_utils import (
     maybe_write_large_message_for_training,
 )
 from lonelypss.ws.handlers.open.compressor_utils import reserve_decompressor
 from lonelypss.ws.handlers.open.errors import AuthRejectedException
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
-from lonelypss.ws.state import CompressorState, NotifyStreamState, StateOpen
+from lonelypss.ws.state import (
+    Compressor,
+    CompressorState,
+    NotifyStreamState,
+    StateOpen,
+)
+
+_MINIMAL_CONTINUE_NOTIFY_PREFIX = struct.Struct(">HH").pack(
+    PubSubStatefulMessageFlags.MINIMAL_HEADERS,
+    BroadcasterToSubscriberStatefulMessageType.CONTINUE_NOTIFY,
+)
+"""The flags and type for every CONTINUE_NOTIFY in minimal headers mode"""
+
+_UINT16 = struct.Struct(">H")
+"""the length prefix of each header value when using minimal headers"""
+
+_YIELD_INTERVAL = 0.001
+"""How long in seconds we will decompress without yielding to the event loop"""
+
+_THREAD_HASH_MIN_SIZE = 64 * 1024
+"""The smallest part we hash in a worker thread rather than on the event loop;
+below this the thread handoff costs more than it saves
+"""
+
+_THREAD_DECOMPRESSION_MIN_SIZE = 64 * 1024
+"""The smallest decompressed message we decompress in a worker thread rather than
+on the event loop; below this the thread handoff costs more than it saves
+"""
+
+_THREAD_DECOMPRESSION_READ_SIZE = 128 * 1024
+"""How many compressed bytes we read at a time when decompressing in a worker
+thread
+"""
+
+
+class _DecompressedSink:
+    """The destination for decompressing in a worker thread; hashes and stores
+    the decompressed data as zstandard writes it, failing as soon as it exceeds
+    the expected length
+    """
+
+    def __init__(self, target: IO[bytes], hasher: "hashlib._Hash", max_length: int):
+        self.target = target
+        self.hasher = hasher
+        self.max_length = max_length
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        self.written += len(data)
+        if self.written > self.max_length:
+            raise Exception("notify stream: received too much data")
+
+        self.hasher.update(data)
+        self.target.write(data)
+        return len(data)
+
+
+def _body_for_notify(body: SyncIOBaseLikeIO) -> Union[SyncIOBaseLikeIO, bytes]:
+    """Returns the entire contents of the body if it is held in memory, which
+    for a BytesIO shares its buffer rather than copying it, otherwise rewinds
+    the file so it can be read from the start
+    """
+    if isinstance(body, io.BytesIO):
+        return body.getvalue()
+
+    body.seek(0)
+    return body
+
+
+def _serialize_continue_notify(
+    identifier: bytes, part_id: int, minimal_headers: bool
+) -> Union[bytes, bytearray]:
+    """Produces the same result as serialize_b2s_continue_notify. This is sent
+    for every part but the last, and with minimal headers its layout is fixed,
+    so it is written directly rather than through the generic header
+    serialization
+    """
+    if not minimal_headers:
+        return serialize_b2s_continue_notify(
+            B2S_ContinueNotify(
+                type=BroadcasterToSubscriberStatefulMessageType.CONTINUE_NOTIFY,
+                identifier=identifier,
+                part_id=part_id,
+            ),
+            minimal_headers=False,
+        )
+
+    part_id_bytes = int_to_minimal_unsigned(part_id)
+    return b"".join(
+        (
+            _MINIMAL_CONTINUE_NOTIFY_PREFIX,
+            _UINT16.pack(len(identifier)),
+            identifier,
+            _UINT16.pack(len(part_id_bytes)),
+            part_id_bytes,
+        )
+    )
 
 
 async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
@@ -33,19 +135,46 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
     messages
     """
 
+    # the first part has its part id of 0 reinterpreted as None
+    part_id = 0 if message.part_id is None else message.part_id
+
     if message.part_id is None:
         if state.notify_stream_state is not None:
             raise Exception(
                 "notify stream: already in progress despite first part received"
             )
 
+        compressor: Optional[Compressor] = None
+        if message.compressor_id is not None:
+            for candidate_compressor in state.compressors:
+                if candidate_compressor.identifier == message.compressor_id:
+                    compressor = candidate_compressor
+                    break
+            else:
+                raise ValueError(f"compressor not found: {message.compressor_id}")
+
         state.notify_stream_state = NotifyStreamState(
             identifier=message.identifier,
             first=dataclasses.replace(message, payload=b""),
+            compressor=compressor,
             part_id=-1,
             body_hasher=hashlib.sha512(),
-            body=tempfile.SpooledTemporaryFile(
-                max_size=state.broadcaster_config.message_body_spool_size
+            body=make_spool_for_length(
+                (
+                    message.compressed_length
+                    if message.compressor_id is not None
+                    else message.uncompressed_length
+                ),
+                state.broadcaster_config.message_body_spool_size,
+            ),
+            training_writer=(
+                maybe_write_large_message_for_training(
+                    state, message.compressed_length, never_store=True
+                )
+                if message.compressor_id is not None
+                else maybe_write_large_message_for_training(
+                    state, message.uncompressed_length
+                )
             ),
         )
 
@@ -55,29 +184,38 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
     if message.identifier != state.notify_stream_state.identifier:
         raise Exception("notify stream: identifier mismatch")
 
-    if message.part_id != state.notify_stream_state.part_id + 1:
+    if part_id != state.notify_stream_state.part_id + 1:
         raise Exception("notify stream: part_id mismatch")
 
     first = state.notify_stream_state.first
 
-    auth_at = time.time()
-    auth_result = await state.broadcaster_config.is_notify_allowed(
-        topic=first.topic,
-        message_sha512=(
-            first.unverified_compressed_sha512
-            if first.compressor_id is not None
-            else first.unverified_uncompressed_sha512
-        ),
-        now=auth_at,
-        authorization=message.authorization,
-    )
+    if is_incoming_auth_allow_all(state.broadcaster_config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await state.broadcaster_config.is_notify_allowed(
+            topic=first.topic,
+            message_sha512=(
+                first.unverified_compressed_sha512
+                if first.compressor_id is not None
+                else first.unverified_uncompressed_sha512
+            ),
+            now=auth_at,
+            authorization=message.authorization,
+        )
 
     if auth_result != "ok":
         raise AuthRejectedException(f"notify stream: {auth_result}")
 
-    state.notify_stream_state.body_hasher.update(message.payload)
+    if len(message.payload) >= _THREAD_HASH_MIN_SIZE:
+        # hashlib releases the GIL for large updates
+        await asyncio.to_thread(
+            state.notify_stream_state.body_hasher.update, message.payload
+        )
+    else:
+        state.notify_stream_state.body_hasher.update(message.payload)
     state.notify_stream_state.body.write(message.payload)
-    state.notify_stream_state.part_id = message.part_id
+    state.notify_stream_state.part_id = part_id
 
     read_so_far = state.notify_stream_state.body.tell()
     expected_length = (
@@ -89,16 +227,15 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
     if read_so_far > expected_length:
         raise Exception("notify stream: received too much data")
 
+    state.notify_stream_state.training_writer.write_chunk(message.payload)
+
     if read_so_far < expected_length:
         send_simple_asap(
             state,
-            serialize_b2s_continue_notify(
-                B2S_ContinueNotify(
-                    type=BroadcasterToSubscriberStatefulMessageType.CONTINUE_NOTIFY,
-                    identifier=message.identifier,
-                    part_id=message.part_id,
-                ),
-                minimal_headers=state.broadcaster_config.websocket_minimal_headers,
+            _serialize_continue_notify(
+                message.identifier,
+                part_id,
+                state.broadcaster_config.websocket_minimal_headers,
             ),
         )
         return
@@ -120,7 +257,7 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
 
         notify_result = await handle_trusted_notify(
             first.topic,
-            io.BytesIO(b""),
+            b"",
             config=state.broadcaster_config,
             session=state.client_session,
             content_length=0,
@@ -146,30 +283,9 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
 
     body = state.notify_stream_state.body
     if first.compressor_id is None:
-        with maybe_write_large_message_for_training(
-            state, first.uncompressed_length
-        ) as training_writer:
-            if training_writer.is_void:
-                training_writer.skip_void()
-            else:
-                body.seek(0)
-
-                while True:
-                    chunk = body.read(
-                        min(io.DEFAULT_BUFFER_SIZE, training_writer.remaining)
-                    )
-                    if not chunk:
-                        break
-                    training_writer.write_chunk(chunk)
-                    if not training_writer.remaining:
-                        break
-
-                    await asyncio.sleep(0)
-
-        body.seek(0)
         notify_result = await handle_trusted_notify(
             first.topic,
-            body,
+            _body_for_notify(body),
             config=state.broadcaster_config,
             session=state.client_session,
             content_length=first.uncompressed_length,
@@ -194,18 +310,14 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
         state.notify_stream_state = None
         return
 
-    for candidate_compressor in state.compressors:
-        if candidate_compressor.identifier == first.compressor_id:
-            compressor = candidate_compressor
-            break
-    else:
-        raise ValueError(f"compressor not found: {first.compressor_id}")
-
+    compressor = state.notify_stream_state.compressor
+    assert compressor is not None, "compressed stream without a compressor"
     if compressor.type == CompressorState.PREPARING:
         compressor = await compressor.task
 
-    with tempfile.SpooledTemporaryFile(
-        max_size=state.broadcaster_config.message_body_spool_size
+    body.seek(0)
+    with make_spool_for_length(
+        first.decompressed_length, state.broadcaster_config.message_body_spool_size
     ) as decompressed_file:
         hasher = hashlib.sha512()
         pos = 0
@@ -214,22 +326,48 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
                 state, first.decompressed_length
             ) as training_writer,
             reserve_decompressor(state, compressor) as reserved_decompressor,
-            reserved_decompressor.stream_reader(cast(IO[bytes], body)) as streamer,
         ):
-            while True:
-                chunk = streamer.read(io.DEFAULT_BUFFER_SIZE)
-                if not chunk:
-                    break
-
-                pos += len(chunk)
-                if pos > first.decompressed_length:
-                    raise Exception("notify stream: received too much data")
-
-                decompressed_file.write(chunk)
-                training_writer.write_chunk(chunk)
-                hasher.update(chunk)
-
-                await asyncio.sleep(0)
+            if (
+                training_writer.is_void
+                and first.decompressed_length >= _THREAD_DECOMPRESSION_MIN_SIZE
+            ):
+                # nothing else touches the body, the decompressed file or the
+                # hasher until we are done, so zstandard can drive the whole
+                # loop in a worker thread
+                training_writer.skip_void()
+                sink = _DecompressedSink(
+                    decompressed_file, hasher, first.decompressed_length
+                )
+                await asyncio.to_thread(
+                    reserved_decompressor.copy_stream,
+                    cast(IO[bytes], body),
+                    cast(IO[bytes], sink),
+                    read_size=_THREAD_DECOMPRESSION_READ_SIZE,
+                )
+                pos = sink.written
+            else:
+                with reserved_decompressor.stream_reader(
+                    cast(IO[bytes], body)
+                ) as streamer:
+                    buffer = memoryview(bytearray(io.DEFAULT_BUFFER_SIZE))
+                    loop = asyncio.get_running_loop()
+                    yield_at = loop.time() + _YIELD_INTERVAL
+                    while True:
+                        chunk = buffer[: streamer.readinto(buffer)]
+                        if not chunk:
+                            break
+
+                        pos += len(chunk)
+                        if pos > first.decompressed_length:
+                            raise Exception("notify stream: received too much data")
+
+                        decompressed_file.write(chunk)
+                        training_writer.write_chunk(chunk)
+                        hasher.update(chunk)
+
+                        if loop.time() >= yield_at:
+                            await asyncio.sleep(0)
+                            yield_at = loop.time() + _YIELD_INTERVAL
 
         if pos != first.decompressed_length:
             raise Exception("notify stream: received too little data")
@@ -239,10 +377,9 @@ async def process_notify(state: StateOpen, message: S2B_NotifyStream) -> None:
         state.notify_stream_state.body.close()
         state.notify_stream_state = None
 
-        decompressed_file.seek(0)
         notify_result = await handle_trusted_notify(
             first.topic,
-            decompressed_file,
+            _body_for_notify(decompressed_file),
             config=state.broadcaster_config,
             session=state.client_session,
             content_length=first.decompressed_length,
@@ -1,3 +1,4 @@
+import functools
 import re
 import time
 from typing import TYPE_CHECKING
@@ -9,6 +10,7 @@ from lonelypsp.stateful.messages.confirm_subscribe import (
 )
 from lonelypsp.stateful.messages.subscribe import S2B_SubscribeGlob
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.ws.handlers.open.errors import AuthRejectedException
 from lonelypss.ws.handlers.open.processors.protocol import S2B_MessageProcessor
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
@@ -27,37 +29,60 @@ except ImportError:
     from fnmatch import translate
 
 
+@functools.lru_cache(maxsize=1024)
+def _compile_glob(glob: str) -> re.Pattern:
+    """Compiles the regex for the given glob pattern, reusing the result when
+    the same pattern is subscribed to again (by this or any other connection)
+    """
+    return re.compile(translate(glob))
+
+
+@functools.lru_cache(maxsize=1024)
+def _serialize_confirm_subscribe_glob(glob: str, minimal_headers: bool) -> bytes:
+    """Serializes the confirmation for the given glob pattern, reusing the result when
+    the same glob pattern is confirmed again (by this or any other connection)
+    """
+    return bytes(
+        serialize_b2s_confirm_subscribe_glob(
+            B2S_ConfirmSubscribeGlob(
+                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_SUBSCRIBE_GLOB,
+                glob=glob,
+            ),
+            minimal_headers=minimal_headers,
+        )
+    )
+
+
 async def process_subscribe_glob(state: StateOpen, message: S2B_SubscribeGlob) -> None:
     """Processes a request by the subscriber to subscribe to utf-8 decodable
     topics which match the given glob pattern, receiving notifications within
     this websocket
     """
     url = make_for_receive_websocket_url_and_change_counter(state)
-    auth_at = time.time()
-    auth_result = await state.broadcaster_config.is_subscribe_glob_allowed(
-        url=url, glob=message.glob, now=auth_at, authorization=message.authorization
-    )
+    if is_incoming_auth_allow_all(state.broadcaster_config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await state.broadcaster_config.is_subscribe_glob_allowed(
+            url=url, glob=message.glob, now=auth_at, authorization=message.authorization
+        )
     if auth_result != "ok":
         raise AuthRejectedException(f"subscribe exact: {auth_result}")
 
-    if any(message.glob == glob for _, glob in state.my_receiver.glob_subscriptions):
+    if message.glob in state.my_receiver.glob_subscriptions:
         raise Exception("already subscribed to glob pattern")
 
-    glob_regex = re.compile(translate(message.glob))
+    glob_regex = _compile_glob(message.glob)
 
     # note we confirm before registering to ensure they don't receive notifications
     # on the topic before its been confirmed
     send_simple_asap(
         state,
-        serialize_b2s_confirm_subscribe_glob(
-            B2S_ConfirmSubscribeGlob(
-                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_SUBSCRIBE_GLOB,
-                glob=message.glob,
-            ),
-            minimal_headers=state.broadcaster_config.websocket_minimal_headers,
+        _serialize_confirm_subscribe_glob(
+            message.glob, state.broadcaster_config.websocket_minimal_headers
         ),
     )
-    state.my_receiver.glob_subscriptions.append((glob_regex, message.glob))
+    state.my_receiver.glob_subscriptions[message.glob] = glob_regex
     await state.internal_receiver.increment_glob(message.glob)
 
 
@@ -1,3 +1,4 @@
+import functools
 import time
 from typing import TYPE_CHECKING
 
@@ -8,6 +9,7 @@ from lonelypsp.stateful.messages.confirm_unsubscribe import (
 )
 from lonelypsp.stateful.messages.unsubscribe import S2B_UnsubscribeExact
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.ws.handlers.open.errors import AuthRejectedException
 from lonelypss.ws.handlers.open.processors.protocol import S2B_MessageProcessor
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
@@ -17,6 +19,22 @@ from lonelypss.ws.handlers.open.websocket_url import (
 from lonelypss.ws.state import StateOpen
 
 
+@functools.lru_cache(maxsize=1024)
+def _serialize_confirm_unsubscribe_exact(topic: bytes, minimal_headers: bool) -> bytes:
+    """Serializes the confirmation for the given topic, reusing the result when
+    the same topic is confirmed again (by this or any other connection)
+    """
+    return bytes(
+        serialize_b2s_confirm_unsubscribe_exact(
+            B2S_ConfirmUnsubscribeExact(
+                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_UNSUBSCRIBE_EXACT,
+                topic=topic,
+            ),
+            minimal_headers=minimal_headers,
+        )
+    )
+
+
 async def process_unsubscribe_exact(
     state: StateOpen, message: S2B_UnsubscribeExact
 ) -> None:
@@ -24,10 +42,16 @@ async def process_unsubscribe_exact(
     no longer receiving notifications within this websocket
     """
     url = make_for_receive_websocket_url_and_change_counter(state)
-    auth_at = time.time()
-    auth_result = await state.broadcaster_config.is_subscribe_exact_allowed(
-        url=url, exact=message.topic, now=auth_at, authorization=message.authorization
-    )
+    if is_incoming_auth_allow_all(state.broadcaster_config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await state.broadcaster_config.is_subscribe_exact_allowed(
+            url=url,
+            exact=message.topic,
+            now=auth_at,
+            authorization=message.authorization,
+        )
     if auth_result != "ok":
         raise AuthRejectedException(f"unsubscribe exact: {auth_result}")
 
@@ -38,12 +62,8 @@ async def process_unsubscribe_exact(
     await state.internal_receiver.decrement_exact(message.topic)
     send_simple_asap(
         state,
-        serialize_b2s_confirm_unsubscribe_exact(
-            B2S_ConfirmUnsubscribeExact(
-                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_UNSUBSCRIBE_EXACT,
-                topic=message.topic,
-            ),
-            minimal_headers=state.broadcaster_config.websocket_minimal_headers,
+        _serialize_confirm_unsubscribe_exact(
+            message.topic, state.broadcaster_config.websocket_minimal_headers
         ),
     )
 
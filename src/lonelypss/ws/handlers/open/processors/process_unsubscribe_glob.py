@@ -1,3 +1,4 @@
+import functools
 import time
 from typing import TYPE_CHECKING
 
@@ -8,6 +9,7 @@ from lonelypsp.stateful.messages.confirm_unsubscribe import (
 )
 from lonelypsp.stateful.messages.unsubscribe import S2B_UnsubscribeGlob
 
+from lonelypss.config.auth_config import is_incoming_auth_allow_all
 from lonelypss.ws.handlers.open.errors import AuthRejectedException
 from lonelypss.ws.handlers.open.processors.protocol import S2B_MessageProcessor
 from lonelypss.ws.handlers.open.send_simple_asap import send_simple_asap
@@ -17,6 +19,22 @@ from lonelypss.ws.handlers.open.websocket_url import (
 from lonelypss.ws.state import StateOpen
 
 
+@functools.lru_cache(maxsize=1024)
+def _serialize_confirm_unsubscribe_glob(glob: str, minimal_headers: bool) -> bytes:
+    """Serializes the confirmation for the given glob pattern, reusing the result when
+    the same glob pattern is confirmed again (by this or any other connection)
+    """
+    return bytes(
+        serialize_b2s_confirm_unsubscribe_glob(
+            B2S_ConfirmUnsubscribeGlob(
+                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_UNSUBSCRIBE_GLOB,
+                glob=glob,
+            ),
+            minimal_headers=minimal_headers,
+        )
+    )
+
+
 async def process_unsubscribe_glob(
     state: StateOpen, message: S2B_UnsubscribeGlob
 ) -> None:
@@ -25,29 +43,25 @@ async def process_unsubscribe_glob(
     exact glob pattern before.
     """
     url = make_for_receive_websocket_url_and_change_counter(state)
-    auth_at = time.time()
-    auth_result = await state.broadcaster_config.is_subscribe_glob_allowed(
-        url=url, glob=message.glob, now=auth_at, authorization=message.authorization
-    )
+    if is_incoming_auth_allow_all(state.broadcaster_config):
+        auth_result = "ok"
+    else:
+        auth_at = time.time()
+        auth_result = await state.broadcaster_config.is_subscribe_glob_allowed(
+            url=url, glob=message.glob, now=auth_at, authorization=message.authorization
+        )
     if auth_result != "ok":
         raise AuthRejectedException(f"subscribe exact: {auth_result}")
 
-    for idx, (_, glob) in enumerate(state.my_receiver.glob_subscriptions):
-        if glob == message.glob:
-            break
-    else:
+    if message.glob not in state.my_receiver.glob_subscriptions:
         raise Exception("not subscribed to glob pattern")
 
-    state.my_receiver.glob_subscriptions.pop(idx)
+    del state.my_receiver.glob_subscriptions[message.glob]
     await state.internal_receiver.decrement_glob(message.glob)
     send_simple_asap(
         state,
-        serialize_b2s_confirm_unsubscribe_glob(
-            B2S_ConfirmUnsubscribeGlob(
-                type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_UNSUBSCRIBE_GLOB,
-                glob=message.glob,
-            ),
-            minimal_headers=state.broadcaster_config.websocket_minimal_headers,
+        _serialize_confirm_unsubscribe_glob(
+            message.glob, state.broadcaster_config.websocket_minimal_headers
         ),
     )
 
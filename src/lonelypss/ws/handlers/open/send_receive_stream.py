@@ -1,13 +1,14 @@
 import asyncio
 import hashlib
 import io
-import secrets
+import struct
 import tempfile
 import time
-from typing import Optional
+from typing import Optional, Tuple, Union
 
 from lonelypsp.stateful.constants import (
     BroadcasterToSubscriberStatefulMessageType,
+    PubSubStatefulMessageFlags,
     SubscriberToBroadcasterStatefulMessageType,
 )
 from lonelypsp.stateful.messages.confirm_receive import S2B_ConfirmReceive
@@ -18,8 +19,13 @@ from lonelypsp.stateful.messages.receive_stream import (
     B2S_ReceiveStreamStartUncompressed,
     serialize_b2s_receive_stream,
 )
+from lonelypsp.stateful.serializer_helpers import int_to_minimal_unsigned
 
-from lonelypss.util.sync_io import SyncReadableBytesIO
+from lonelypss.util.sync_io import (
+    SyncReadableBytesIO,
+    SyncWritableBytesIO,
+    make_chunk_reader,
+)
 from lonelypss.ws.handlers.open.collector_utils import (
     maybe_write_large_message_for_training,
 )
@@ -35,6 +41,32 @@ from lonelypss.ws.state import (
     StateOpen,
 )
 
+try:
+    import zstandard
+except ImportError:
+    ...
+
+_YIELD_INTERVAL = 0.001
+"""How long in seconds we will compress without yielding to the event loop"""
+
+_SHA512_SEED = hashlib.sha512()
+"""An untouched sha512 hasher that is copied rather than constructing a new one
+for each compressed message
+"""
+
+_THREAD_COMPRESSION_MIN_SIZE = 64 * 1024
+"""The smallest in-memory message we compress in a worker thread rather than on
+the event loop; below this the thread handoff costs more than it saves
+"""
+
+_UINT16 = struct.Struct(">H")
+
+_MINIMAL_CONTINUATION_PREFIX = struct.Struct(">HH").pack(
+    PubSubStatefulMessageFlags.MINIMAL_HEADERS,
+    BroadcasterToSubscriberStatefulMessageType.RECEIVE_STREAM,
+)
+"""The flags and type for every RECEIVE_STREAM continuation in minimal headers mode"""
+
 
 async def send_receive_stream(
     state: StateOpen,
@@ -123,7 +155,7 @@ async def send_uncompressed_receive_stream(
         message_sha512=sha512,
         now=time.time(),
     )
-    identifier = secrets.token_bytes(4)
+    identifier = state.identifier_pool.take(4)
 
     headers = serialize_b2s_receive_stream(
         B2S_ReceiveStreamStartUncompressed(
@@ -188,46 +220,78 @@ async def send_compressed_receive_stream(
     with tempfile.SpooledTemporaryFile(
         max_size=state.broadcaster_config.message_body_spool_size
     ) as to_send:
-        hasher = hashlib.sha512()
+        hasher = _SHA512_SEED.copy()
         with (
             maybe_write_large_message_for_training(
                 state, uncompressed_length, never_store=not maybe_store_for_training
             ) as training_writer,
             reserve_compressor(state, compressor) as reserved_compressor,
         ):
-            chunker = reserved_compressor.chunker(
-                size=uncompressed_length, chunk_size=io.DEFAULT_BUFFER_SIZE
-            )
+            if (
+                isinstance(uncompressed_stream, io.BytesIO)
+                and uncompressed_length >= _THREAD_COMPRESSION_MIN_SIZE
+            ):
+                # the whole message is already in memory, so there's no reading
+                # to interleave and the compressor can run without the GIL
+                start = uncompressed_stream.tell()
+                data = uncompressed_stream.getbuffer()[
+                    start : start + uncompressed_length
+                ]
+                if len(data) != uncompressed_length:
+                    raise ValueError("stream shorter than uncompressed_length")
+                training_writer.write_chunk(data)
+                await asyncio.to_thread(
+                    _compress_into, reserved_compressor, data, to_send, hasher
+                )
+                uncompressed_stream.seek(start + uncompressed_length)
+            else:
+                chunker = reserved_compressor.chunker(
+                    size=uncompressed_length, chunk_size=io.DEFAULT_BUFFER_SIZE
+                )
+                read_chunk = make_chunk_reader(
+                    uncompressed_stream, io.DEFAULT_BUFFER_SIZE
+                )
 
-            while True:
-                if read_lock is None:
-                    uncompressed_chunk = uncompressed_stream.read(
-                        io.DEFAULT_BUFFER_SIZE
-                    )
-                else:
-                    async with read_lock:
-                        uncompressed_chunk = uncompressed_stream.read(
-                            io.DEFAULT_BUFFER_SIZE
+                # yielding after every chunk costs an event loop iteration each
+                # time; instead only yield once we've held the loop for a while
+                loop = asyncio.get_running_loop()
+                yield_at = loop.time() + _YIELD_INTERVAL
+
+                remaining = uncompressed_length
+                while remaining > 0:
+                    if read_lock is None:
+                        uncompressed_chunk = read_chunk(
+                            min(remaining, io.DEFAULT_BUFFER_SIZE)
                         )
-                if not uncompressed_chunk:
-                    break
+                    else:
+                        async with read_lock:
+                            uncompressed_chunk = read_chunk(
+                                min(remaining, io.DEFAULT_BUFFER_SIZE)
+                            )
+                    if not uncompressed_chunk:
+                        break
+                    remaining -= len(uncompressed_chunk)
+
+                    training_writer.write_chunk(uncompressed_chunk)
+                    for chunk in chunker.compress(uncompressed_chunk):
+                        to_send.write(chunk)
+                        hasher.update(chunk)
+                        if loop.time() >= yield_at:
+                            await asyncio.sleep(0)
+                            yield_at = loop.time() + _YIELD_INTERVAL
 
-                training_writer.write_chunk(uncompressed_chunk)
-                for chunk in chunker.compress(uncompressed_chunk):
+                for chunk in chunker.finish():
                     to_send.write(chunk)
                     hasher.update(chunk)
-                    await asyncio.sleep(0)
-
-            for chunk in chunker.finish():
-                to_send.write(chunk)
-                hasher.update(chunk)
-                await asyncio.sleep(0)
+                    if loop.time() >= yield_at:
+                        await asyncio.sleep(0)
+                        yield_at = loop.time() + _YIELD_INTERVAL
 
         compressed_length = to_send.tell()
         compressed_sha512 = hasher.digest()
         to_send.seek(0)
 
-        identifier = secrets.token_bytes(4)
+        identifier = state.identifier_pool.take(4)
         headers = serialize_b2s_receive_stream(
             B2S_ReceiveStreamStartCompressed(
                 type=BroadcasterToSubscriberStatefulMessageType.RECEIVE_STREAM,
@@ -261,6 +325,24 @@ async def send_compressed_receive_stream(
         )
 
 
+def _compress_into(
+    compressor: "zstandard.ZstdCompressor",
+    data: memoryview,
+    target: SyncWritableBytesIO,
+    hasher: "hashlib._Hash",
+) -> None:
+    """Compresses all of data into target, updating hasher with the compressed
+    bytes. Only touches its arguments, so it is safe to run in a worker thread
+    """
+    chunker = compressor.chunker(size=len(data), chunk_size=io.DEFAULT_BUFFER_SIZE)
+    for chunk in chunker.compress(data):
+        target.write(chunk)
+        hasher.update(chunk)
+    for chunk in chunker.finish():
+        target.write(chunk)
+        hasher.update(chunk)
+
+
 async def send_receive_stream_given_first_headers(
     state: StateOpen,
     stream: SyncReadableBytesIO,
@@ -297,6 +379,24 @@ async def send_receive_stream_given_first_headers(
     """
     headers = first_headers
     msg_size = state.broadcaster_config.outgoing_max_ws_message_size or (2**64 - 1)
+    minimal_headers = state.broadcaster_config.websocket_minimal_headers
+    identifier_header = _UINT16.pack(len(identifier)) + identifier
+
+    # when the stream supports it, read each payload directly after the headers
+    # in the outgoing message rather than reading and then concatenating
+    readinto = getattr(stream, "readinto", None)
+
+    def read_message(n: int) -> Tuple[Union[bytes, bytearray], memoryview]:
+        if readinto is None:
+            payload = stream.read(n)
+            return headers + payload, memoryview(payload)
+
+        message = bytearray(len(headers) + n)
+        message[: len(headers)] = headers
+        with memoryview(message) as view, view[len(headers) :] as target:
+            got = readinto(target) or 0
+        del message[len(headers) + got :]
+        return message, memoryview(message)[len(headers) :]
 
     part_id = 0
     pos = 0
@@ -304,15 +404,16 @@ async def send_receive_stream_given_first_headers(
         state, length, never_store=not maybe_store_for_training
     ) as training_writer:
         while True:
+            read_size = min(length - pos, max(512, msg_size - len(headers)))
             if read_lock is None:
-                payload = stream.read(max(512, msg_size - len(headers)))
+                message, payload = read_message(read_size)
             else:
                 async with read_lock:
-                    payload = stream.read(max(512, msg_size - len(headers)))
+                    message, payload = read_message(read_size)
             training_writer.write_chunk(payload)
             pos += len(payload)
             is_done = pos >= length
-            await state.expecting_acks.put(
+            expected_ack: Union[S2B_ConfirmReceive, S2B_ContinueReceive] = (
                 S2B_ConfirmReceive(
                     type=SubscriberToBroadcasterStatefulMessageType.CONFIRM_RECEIVE,
                     identifier=identifier,
@@ -324,7 +425,13 @@ async def send_receive_stream_given_first_headers(
                     part_id=part_id,
                 )
             )
-            await state.websocket.send_bytes(headers + payload)
+            # only go through the awaitable put when we actually need to wait
+            # for the subscriber to acknowledge earlier messages
+            if state.expecting_acks.full():
+                await state.expecting_acks.put(expected_ack)
+            else:
+                state.expecting_acks.put_nowait(expected_ack)
+            await state.websocket.send_bytes(message)
 
             if is_done:
                 return
@@ -336,13 +443,42 @@ async def send_receive_stream_given_first_headers(
                 message_sha512=sha512,
                 now=time.time(),
             )
-            headers = serialize_b2s_receive_stream(
-                B2S_ReceiveStreamContinuation(
-                    type=BroadcasterToSubscriberStatefulMessageType.RECEIVE_STREAM,
-                    authorization=authorization,
-                    identifier=identifier,
-                    part_id=part_id,
-                    payload=b"",
-                ),
-                minimal_headers=state.broadcaster_config.websocket_minimal_headers,
-            )
+            if minimal_headers:
+                headers = _serialize_minimal_continuation_headers(
+                    authorization, identifier_header, part_id
+                )
+            else:
+                headers = serialize_b2s_receive_stream(
+                    B2S_ReceiveStreamContinuation(
+                        type=BroadcasterToSubscriberStatefulMessageType.RECEIVE_STREAM,
+                        authorization=authorization,
+                        identifier=identifier,
+                        part_id=part_id,
+                        payload=b"",
+                    ),
+                    minimal_headers=False,
+                )
+
+
+def _serialize_minimal_continuation_headers(
+    authorization: Optional[str], identifier_header: bytes, part_id: int
+) -> bytes:
+    """Produces the same result as serialize_b2s_receive_stream for a continuation
+    with minimal headers and an empty payload, where identifier_header is the
+    already length-prefixed identifier. Only the authorization and part id change
+    between parts of the same message, so the rest is not reserialized each time
+    """
+    authorization_bytes = (
+        authorization.encode("utf-8") if authorization is not None else b""
+    )
+    part_id_bytes = int_to_minimal_unsigned(part_id)
+    return b"".join(
+        (
+            _MINIMAL_CONTINUATION_PREFIX,
+            _UINT16.pack(len(authorization_bytes)),
+            authorization_bytes,
+            identifier_header,
+            _UINT16.pack(len(part_id_bytes)),
+            part_id_bytes,
+        )
+    )
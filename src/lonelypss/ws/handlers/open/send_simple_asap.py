@@ -14,6 +14,9 @@ def send_simple_asap(state: StateOpen, data: bytes) -> None:
         state.send_task = asyncio.create_task(state.websocket.send_bytes(data))
         return
 
+    if len(state.unsent_messages) == state.unsent_messages.maxlen:
+        raise Exception("too many unsent messages")
+
     state.unsent_messages.append(
         SimplePendingSendPreFormatted(
             type=SimplePendingSendType.PRE_FORMATTED, data=data
@@ -4,10 +4,18 @@ import tempfile
 from types import TracebackType
 from typing import TYPE_CHECKING, Optional, Type
 
-from lonelypss.util.sync_io import SyncIOBaseLikeIO, SyncReadableBytesIO
+from lonelypss.util.sync_io import (
+    SyncIOBaseLikeIO,
+    SyncReadableBytesIO,
+    make_chunk_reader,
+)
 from lonelypss.ws.handlers.open.send_receive_stream import send_receive_stream
 from lonelypss.ws.handlers.open.senders.protocol import Sender
 from lonelypss.ws.state import InternalLargeMessage, StateOpen
+from lonelypss.ws.util import wait_first_completed
+
+_YIELD_INTERVAL = 0.001
+"""How long in seconds we will copy to the spool without yielding to the event loop"""
 
 
 async def send_internal_large_message(
@@ -46,11 +54,6 @@ async def send_internal_large_message(
 
         read_lock = asyncio.Lock()
         with _SwappableSyncReadableBytesIO(message.stream, message.length) as stream:
-            timeout = asyncio.create_task(
-                asyncio.sleep(
-                    state.broadcaster_config.websocket_large_direct_send_timeout
-                )
-            )
             send_task = asyncio.create_task(
                 send_receive_stream(
                     state,
@@ -63,11 +66,11 @@ async def send_internal_large_message(
                 )
             )
 
-            await asyncio.wait(
-                [timeout, send_task], return_when=asyncio.FIRST_COMPLETED
+            await wait_first_completed(
+                [send_task],
+                timeout=state.broadcaster_config.websocket_large_direct_send_timeout,
             )
 
-            timeout.cancel()
             if not send_task.done():
                 async with read_lock:
                     await stream.swap(
@@ -109,19 +112,27 @@ class _SwappableSyncReadableBytesIO:
         assert self._original_remaining is not None
 
         target = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        read_chunk = make_chunk_reader(self._original_stream, io.DEFAULT_BUFFER_SIZE)
         remaining = self._original_remaining
+        loop = asyncio.get_running_loop()
+        yield_at = loop.time() + _YIELD_INTERVAL
         try:
-            while True:
-                chunk = self._original_stream.read(
-                    min(remaining, io.DEFAULT_BUFFER_SIZE)
-                )
+            while remaining > 0:
+                chunk = read_chunk(min(remaining, io.DEFAULT_BUFFER_SIZE))
                 if not chunk:
                     break
                 target.write(chunk)
-                await asyncio.sleep(0)
+                remaining -= len(chunk)
+                if loop.time() >= yield_at:
+                    await asyncio.sleep(0)
+                    yield_at = loop.time() + _YIELD_INTERVAL
 
             target.seek(0)
             self._swapped_stream = target
+            # the original stream is released once we return, so it must
+            # not be read from again even after the copy is exhausted
+            self._original_stream = None
+            self._original_remaining = None
         except BaseException:
             target.close()
             raise
@@ -145,6 +156,26 @@ class _SwappableSyncReadableBytesIO:
             self._original_remaining = None
         return chunk
 
+    def readinto(self, b: memoryview, /) -> int:
+        if self._swapped_stream is not None or self._original_stream is None:
+            result = self.read(len(b))
+            b[: len(result)] = result
+            return len(result)
+
+        assert self._original_remaining is not None
+        original_readinto = getattr(self._original_stream, "readinto", None)
+        if original_readinto is None:
+            result = self.read(len(b))
+            b[: len(result)] = result
+            return len(result)
+
+        got = original_readinto(b[: self._original_remaining]) or 0
+        self._original_remaining -= got
+        if self._original_remaining == 0:
+            self._original_stream = None
+            self._original_remaining = None
+        return got
+
     def close(self) -> None:
         self._original_stream = None
         self._original_remaining = None
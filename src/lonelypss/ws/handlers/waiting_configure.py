@@ -1,15 +1,15 @@
 import asyncio
 import base64
 import hashlib
-import io
-import secrets
+import os
+import struct
 import tempfile
 from collections import deque
-from typing import TYPE_CHECKING, List, cast
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union, cast
 
-import aiohttp
 from lonelypsp.stateful.constants import (
     BroadcasterToSubscriberStatefulMessageType,
+    PubSubStatefulMessageFlags,
     SubscriberToBroadcasterStatefulMessageType,
 )
 from lonelypsp.stateful.messages.configure import S2B_ConfigureParser
@@ -17,9 +17,11 @@ from lonelypsp.stateful.messages.confirm_configure import (
     B2S_ConfirmConfigure,
     serialize_b2s_confirm_configure,
 )
-from lonelypsp.stateful.parser_helpers import parse_s2b_message_prefix
 
+from lonelypss.config.lifespan import get_http_client_session
+from lonelypss.util.random_bytes_pool import RandomBytesPool
 from lonelypss.util.websocket_message import WSMessageBytes
+from lonelypss.ws.handlers.open.check_compressors import serialize_enable_compressor
 from lonelypss.ws.handlers.protocol import StateHandler
 from lonelypss.ws.simple_receiver import SimpleReceiver
 from lonelypss.ws.state import (
@@ -31,16 +33,126 @@ from lonelypss.ws.state import (
     CompressorTrainingInfoBeforeLowWatermark,
     CompressorTrainingInfoType,
     ConnectionConfiguration,
+    SimplePendingSendPreFormatted,
+    SimplePendingSendType,
     State,
     StateClosing,
     StateOpen,
     StateType,
     StateWaitingConfigure,
+    WaitingInternalMessage,
 )
-from lonelypss.ws.util import make_websocket_read_task
+from lonelypss.ws.util import make_websocket_read_task, parse_s2b_payload_prefix
 
+try:
+    import zstandard
+except ImportError:
+    ...
 
-async def _make_standard_compressor(state: StateWaitingConfigure) -> CompressorReady:
+_BROADCASTER_NONCE_LENGTH = 32
+"""how many random bytes the broadcaster contributes to the connection nonce"""
+
+_BROADCASTER_NONCE_POOL = RandomBytesPool()
+"""Shared by every handshake in the process so that a burst of connections does
+not ask the operating system for randomness once per connection. Like the rest
+of the websocket handling this assumes a single event loop per process, so it is
+only ever touched from that loop's thread
+"""
+
+
+def _reset_broadcaster_nonce_pool() -> None:
+    """Replaces the nonce pool in a forked child. The child otherwise inherits
+    the parent's buffer and offset, so it and its siblings would hand out the
+    same nonces
+    """
+    global _BROADCASTER_NONCE_POOL
+    _BROADCASTER_NONCE_POOL = RandomBytesPool()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_broadcaster_nonce_pool)
+
+_MINIMAL_CONFIRM_CONFIGURE_PREFIX = struct.Struct(">HHH").pack(
+    PubSubStatefulMessageFlags.MINIMAL_HEADERS,
+    BroadcasterToSubscriberStatefulMessageType.CONFIRM_CONFIGURE,
+    _BROADCASTER_NONCE_LENGTH,
+)
+"""The flags, type, and nonce length prefix of every CONFIRM_CONFIGURE in minimal
+headers mode; only the nonce itself follows
+"""
+
+
+_SharedPoolsEntry = Tuple[
+    "Optional[zstandard.ZstdCompressionDict]",
+    "List[zstandard.ZstdCompressor]",
+    "List[zstandard.ZstdDecompressor]",
+]
+
+_SHARED_POOLS: Dict[Tuple[int, int, int], _SharedPoolsEntry] = {}
+"""The dictionary and the compressor and decompressor pools used by the standard
+and preset compressors, keyed by (identifier, level, max decompression window
+size). Unlike trained compressors these are the same for every connection, so
+connections share one pool rather than each building (and digesting the
+dictionary for) their own.
+
+A preset identifier always refers to the same dictionary, as subscribers get
+it out of band, so the dictionary from the first connection is kept rather than
+comparing every newly loaded one. Only touched from the event loop thread (see
+_BROADCASTER_NONCE_POOL)
+"""
+
+
+def _get_shared_pools(
+    state: StateWaitingConfigure,
+    identifier: int,
+    level: int,
+    data: "Optional[zstandard.ZstdCompressionDict]",
+) -> _SharedPoolsEntry:
+    """Returns the dictionary to use along with the shared compressor and
+    decompressor pools for the given standard or preset compressor. The pools
+    are only replaced if the dictionary is recognizably different, i.e., it
+    carries a different dictionary id
+    """
+    key = (
+        identifier,
+        level,
+        state.broadcaster_config.decompression_max_window_size,
+    )
+    entry = _SHARED_POOLS.get(key)
+    if entry is None or _dict_id(entry[0]) != _dict_id(data):
+        entry = (data, [], [])
+        _SHARED_POOLS[key] = entry
+    return entry
+
+
+def _dict_id(data: "Optional[zstandard.ZstdCompressionDict]") -> int:
+    """The id from the dictionary header, or 0 for no dictionary or a raw
+    content dictionary
+    """
+    return 0 if data is None else data.dict_id()
+
+
+def _serialize_confirm_configure(
+    broadcaster_nonce: bytes, minimal_headers: bool
+) -> Union[bytes, bytearray]:
+    """Produces the same result as serialize_b2s_confirm_configure. With minimal
+    headers only the nonce differs between connections, so it is appended to the
+    precomputed prefix rather than going through the generic header serialization
+    """
+    if minimal_headers and len(broadcaster_nonce) == _BROADCASTER_NONCE_LENGTH:
+        return _MINIMAL_CONFIRM_CONFIGURE_PREFIX + broadcaster_nonce
+
+    return serialize_b2s_confirm_configure(
+        B2S_ConfirmConfigure(
+            type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_CONFIGURE,
+            broadcaster_nonce=broadcaster_nonce,
+        ),
+        minimal_headers=minimal_headers,
+    )
+
+
+def _make_standard_compressor(state: StateWaitingConfigure) -> CompressorReady:
+    _, compressors, decompressors = _get_shared_pools(state, 1, 3, None)
     return CompressorReady(
         type=CompressorState.READY,
         identifier=1,
@@ -48,8 +160,8 @@ async def _make_standard_compressor(state: StateWaitingConfigure) -> CompressorR
         min_size=state.broadcaster_config.compression_trained_max_size,
         max_size=None,
         data=None,
-        compressors=list(),
-        decompressors=list(),
+        compressors=compressors,
+        decompressors=decompressors,
     )
 
 
@@ -62,6 +174,9 @@ async def _make_preset_compressor(
     if compressor_info is None:
         raise ValueError(f"Unknown compressor ID {compressor_id}")
     zdict, level = compressor_info
+    data, compressors, decompressors = _get_shared_pools(
+        state, compressor_id, level, zdict
+    )
 
     return CompressorReady(
         type=CompressorState.READY,
@@ -69,9 +184,9 @@ async def _make_preset_compressor(
         level=level,
         min_size=state.broadcaster_config.compression_min_size,
         max_size=None,
-        data=zdict,
-        compressors=list(),
-        decompressors=list(),
+        data=data,
+        compressors=compressors,
+        decompressors=decompressors,
     )
 
 
@@ -90,8 +205,7 @@ async def handle_waiting_configure(state: State) -> State:
         return StateClosing(type=StateType.CLOSING, websocket=state.websocket)
 
     raw_message = cast(WSMessageBytes, ws_message)
-    raw_message_reader = io.BytesIO(raw_message["bytes"])
-    prefix = parse_s2b_message_prefix(raw_message_reader)
+    prefix, raw_message_reader = parse_s2b_payload_prefix(raw_message["bytes"])
     if prefix.type != SubscriberToBroadcasterStatefulMessageType.CONFIGURE:
         return StateClosing(type=StateType.CLOSING, websocket=state.websocket)
 
@@ -99,18 +213,26 @@ async def handle_waiting_configure(state: State) -> State:
     receiver = SimpleReceiver()
     receiver_id = await state.internal_receiver.register_receiver(receiver)
     try:
-        broadcaster_nonce = secrets.token_bytes(32)
+        broadcaster_nonce = _BROADCASTER_NONCE_POOL.take(_BROADCASTER_NONCE_LENGTH)
         connection_nonce = hashlib.sha256(
             message.subscriber_nonce + broadcaster_nonce
         ).digest()
 
         compressors: List[Compressor] = []
+        unsent_messages: deque[
+            Union[WaitingInternalMessage, SimplePendingSendPreFormatted]
+        ] = deque(maxlen=state.broadcaster_config.websocket_max_pending_sends)
         if state.broadcaster_config.compression_allowed and message.enable_zstd:
-            compressors.append(
-                CompressorPreparing(
-                    type=CompressorState.PREPARING,
-                    identifier=1,
-                    task=asyncio.create_task(_make_standard_compressor(state)),
+            # the standard compressor needs nothing loaded, so it is ready
+            # immediately; it is announced right after the configure confirmation
+            standard_compressor = _make_standard_compressor(state)
+            compressors.append(standard_compressor)
+            unsent_messages.append(
+                SimplePendingSendPreFormatted(
+                    type=SimplePendingSendType.PRE_FORMATTED,
+                    data=serialize_enable_compressor(
+                        state.broadcaster_config, standard_compressor
+                    ),
                 )
             )
 
@@ -137,7 +259,7 @@ async def handle_waiting_configure(state: State) -> State:
             internal_receiver=state.internal_receiver,
             my_receiver=receiver,
             my_receiver_id=receiver_id,
-            client_session=aiohttp.ClientSession(),
+            client_session=get_http_client_session(state.broadcaster_config),
             compressors=compressors,
             compressor_training_info=(
                 None
@@ -150,7 +272,9 @@ async def handle_waiting_configure(state: State) -> State:
                         collector=CompressorTrainingDataCollector(
                             messages=0,
                             length=0,
-                            tmpfile=tempfile.TemporaryFile(mode="w+b", buffering=-1),
+                            tmpfile=tempfile.SpooledTemporaryFile(
+                                max_size=state.broadcaster_config.message_body_spool_size
+                            ),
                             pending=set(),
                         ),
                     )
@@ -158,17 +282,15 @@ async def handle_waiting_configure(state: State) -> State:
             ),
             broadcaster_counter=1,
             subscriber_counter=-1,
+            identifier_pool=RandomBytesPool(),
             read_task=make_websocket_read_task(state.websocket),
             internal_message_task=asyncio.create_task(receiver.queue.get()),
             notify_stream_state=None,
             send_task=asyncio.create_task(
                 state.websocket.send_bytes(
-                    serialize_b2s_confirm_configure(
-                        B2S_ConfirmConfigure(
-                            type=BroadcasterToSubscriberStatefulMessageType.CONFIRM_CONFIGURE,
-                            broadcaster_nonce=broadcaster_nonce,
-                        ),
-                        minimal_headers=state.broadcaster_config.websocket_minimal_headers,
+                    _serialize_confirm_configure(
+                        broadcaster_nonce,
+                        state.broadcaster_config.websocket_minimal_headers,
                     )
                 )
             ),
@@ -176,9 +298,7 @@ async def handle_waiting_configure(state: State) -> State:
             unprocessed_messages=deque(
                 maxlen=state.broadcaster_config.websocket_max_unprocessed_receives
             ),
-            unsent_messages=deque(
-                maxlen=state.broadcaster_config.websocket_max_pending_sends
-            ),
+            unsent_messages=unsent_messages,
             expecting_acks=asyncio.Queue(
                 maxsize=state.broadcaster_config.websocket_send_max_unacknowledged or 0
             ),
@@ -1,6 +1,15 @@
 import asyncio
 import re
-from typing import TYPE_CHECKING, List, Optional, Set, Tuple, Type, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 
 from lonelypss.util.sync_io import SyncReadableBytesIO
 from lonelypss.ws.state import (
@@ -11,20 +20,107 @@ from lonelypss.ws.state import (
 )
 
 
+class _GlobSubscriptions(Dict[str, re.Pattern]):
+    """A dict of glob subscriptions which clears the combined pattern of the
+    receiver that owns it whenever it is mutated, so that callers can continue
+    to manipulate it directly (though not via `|=`)
+    """
+
+    def __init__(self, owner: "SimpleReceiver") -> None:
+        super().__init__()
+        self._owner = owner
+
+    def __setitem__(self, key: str, value: re.Pattern, /) -> None:
+        self._owner._combined_glob = None
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: str, /) -> None:
+        self._owner._combined_glob = None
+        super().__delitem__(key)
+
+    def pop(self, key: str, /, *args: Any) -> Any:
+        self._owner._combined_glob = None
+        return super().pop(key, *args)
+
+    def popitem(self) -> Tuple[str, re.Pattern]:
+        self._owner._combined_glob = None
+        return super().popitem()
+
+    def setdefault(self, key: str, default: re.Pattern, /) -> re.Pattern:
+        self._owner._combined_glob = None
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self._owner._combined_glob = None
+        super().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        self._owner._combined_glob = None
+        super().clear()
+
+
+class _CombinedGlob:
+    """A regex matching any of several glob patterns, compiled both for str
+    topics and, when possible, for ascii topics as bytes
+    """
+
+    def __init__(self, source: str) -> None:
+        self.pattern: "re.Pattern[str]" = re.compile(source)
+        """the pattern to use against utf-8 decoded topics"""
+
+        self.ascii_pattern: "Optional[re.Pattern[bytes]]" = None
+        """the same pattern for matching ascii topics without decoding them, if
+        it could be compiled in bytes mode
+        """
+        try:
+            self.ascii_pattern = re.compile(source.encode("utf-8"))
+        except re.error:
+            ...
+
+
 class SimpleReceiver:
     def __init__(self) -> None:
         self.exact_subscriptions: Set[bytes] = set()
-        self.glob_subscriptions: List[Tuple[re.Pattern, str]] = []
+        self.glob_subscriptions: Dict[str, re.Pattern] = _GlobSubscriptions(self)
         self.receiver_id: Optional[int] = None
 
         self.queue: asyncio.Queue[Union[InternalLargeMessage, InternalSmallMessage]] = (
             asyncio.Queue()
         )
 
+        self._combined_glob: Optional[_CombinedGlob] = None
+        """a single pattern matching any of the glob subscriptions, built lazily
+        and cleared whenever glob_subscriptions changes
+        """
+
     def is_relevant(self, topic: bytes) -> bool:
-        return topic in self.exact_subscriptions or any(
-            pattern.match(topic) for pattern, _ in self.glob_subscriptions
-        )
+        if topic in self.exact_subscriptions:
+            return True
+
+        if not self.glob_subscriptions:
+            return False
+
+        combined = self._combined_glob
+        if combined is None:
+            combined = _CombinedGlob(
+                "|".join(
+                    f"(?:{pattern.pattern})"
+                    for pattern in self.glob_subscriptions.values()
+                )
+            )
+            self._combined_glob = combined
+
+        # for ascii topics every character is one byte, so the pattern matches
+        # the same way on the raw bytes and we can skip decoding the topic
+        if combined.ascii_pattern is not None and topic.isascii():
+            return combined.ascii_pattern.match(topic) is not None
+
+        try:
+            topic_str = topic.decode("utf-8")
+        except UnicodeDecodeError:
+            return False
+
+        return combined.pattern.match(topic_str) is not None
 
     async def on_large_exclusive_incoming(
         self,
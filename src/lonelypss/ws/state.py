@@ -4,7 +4,16 @@ import re
 from collections import deque
 from dataclasses import dataclass
 from enum import Enum, auto
-from typing import List, Literal, Optional, Protocol, Set, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Protocol,
+    Set,
+    Union,
+)
 
 import aiohttp
 from fastapi import WebSocket
@@ -17,6 +26,7 @@ from lonelypsp.stateful.messages.notify_stream import (
 )
 
 from lonelypss.config.config import Config
+from lonelypss.util.random_bytes_pool import RandomBytesPool
 from lonelypss.util.sync_io import SyncIOBaseLikeIO, SyncReadableBytesIO
 from lonelypss.util.websocket_message import WSMessage
 from lonelypss.util.ws_receiver import BaseWSReceiver, FanoutWSReceiver
@@ -26,6 +36,11 @@ try:
 except ImportError:
     ...
 
+if TYPE_CHECKING:
+    from lonelypss.ws.handlers.open.collector_utils import (
+        CompressorLargeMessageWriter,
+    )
+
 
 @dataclass
 class ConnectionConfiguration:
@@ -35,6 +50,11 @@ class ConnectionConfiguration:
     subscriber what we chose (for convenience).
     """
 
+    __slots__ = (
+        "enable_zstd",
+        "enable_training",
+    )
+
     enable_zstd: bool
     """True if the subscriber can use zstandard-compressed data and might send
     zstandard-compressed data, false if the broadcaster should not send
@@ -245,10 +265,10 @@ class AsyncioWSReceiver(BaseWSReceiver, Protocol):
         """
 
     @property
-    def glob_subscriptions(self) -> List[Tuple[re.Pattern, str]]:
+    def glob_subscriptions(self) -> Dict[str, re.Pattern]:
         """The glob patterns that the receiver returns True to from is_relevant,
-        that the caller can mutate. The first element in each tuple is the regex
-        that matches the pattern, and the second element is the original pattern
+        that the caller can mutate. The keys are the original patterns and the
+        values are the regexes that match them
         """
 
     @property
@@ -264,6 +284,13 @@ class CompressorTrainingDataCollector:
     compression dictionary for this connection
     """
 
+    __slots__ = (
+        "messages",
+        "length",
+        "tmpfile",
+        "pending",
+    )
+
     messages: int
     """the number of messages that have been collected so far"""
 
@@ -280,7 +307,7 @@ class CompressorTrainingDataCollector:
 
     typically, if writing a small message, the flow is:
     - seek to the end (`seek(0, os.SEEK_END)`)
-    - write the length prefix (`length.to_bytes(4, "big")`)
+    - write the length prefix (4 bytes, big-endian, unsigned)
     - write the data
     - yield to the event loop
 
@@ -288,7 +315,7 @@ class CompressorTrainingDataCollector:
     - store a reference to the collector as the states collector may change
     - create an asyncio.Event, add it to the 'pending' set
     - seek to the end (`seek(0, os.SEEK_END)`)
-    - write the length prefix (`length.to_bytes(4, "big")`)
+    - write the length prefix (4 bytes, big-endian, unsigned)
     - remember the current position (`pos = tell()`)
     - write zeros for the data
     - yield to the event loop
@@ -394,6 +421,17 @@ class CompressorState(Enum):
 class CompressorReady:
     """A compressor which is ready to use"""
 
+    __slots__ = (
+        "type",
+        "identifier",
+        "level",
+        "min_size",
+        "max_size",
+        "data",
+        "compressors",
+        "decompressors",
+    )
+
     type: Literal[CompressorState.READY]
     """discriminator value"""
 
@@ -478,6 +516,12 @@ class NotifyStreamState:
     first: Union[S2B_NotifyStreamStartUncompressed, S2B_NotifyStreamStartCompressed]
     """The first stream message with this id, with the payload stripped out"""
 
+    compressor: Optional[Compressor]
+    """The compressor the body is compressed with, resolved from the first part
+    so that it cannot be rotated out from under us mid-stream, or None if the
+    body is not compressed
+    """
+
     part_id: int
     """The last part id that we received"""
 
@@ -489,6 +533,12 @@ class NotifyStreamState:
     the body of the message as it comes in. closing this file will delete the data
     """
 
+    training_writer: "CompressorLargeMessageWriter"
+    """where the body is copied for compression training as it comes in, so that
+    it does not need to be read back from `body` afterwards. a void writer for
+    compressed streams, since those are stored once decompressed
+    """
+
 
 @dataclass
 class StateWaitingConfigure:
@@ -524,6 +574,32 @@ class StateOpen:
     of the time the websocket connection is active
     """
 
+    __slots__ = (
+        "type",
+        "websocket",
+        "broadcaster_config",
+        "connection_config",
+        "nonce_b64",
+        "internal_receiver",
+        "my_receiver",
+        "my_receiver_id",
+        "client_session",
+        "compressors",
+        "compressor_training_info",
+        "broadcaster_counter",
+        "subscriber_counter",
+        "identifier_pool",
+        "read_task",
+        "internal_message_task",
+        "notify_stream_state",
+        "send_task",
+        "process_task",
+        "unprocessed_messages",
+        "unsent_messages",
+        "expecting_acks",
+        "backgrounded",
+    )
+
     type: Literal[StateType.OPEN]
     """discriminator value"""
 
@@ -556,7 +632,8 @@ class StateOpen:
 
     client_session: aiohttp.ClientSession
     """the aiohttp ClientSession for notifying other subscribers when this subscriber
-    notifies the broadcaster via NOTIFY or NOTIFY_STREAM
+    notifies the broadcaster via NOTIFY or NOTIFY_STREAM. This is the broadcaster's
+    shared session, so it is not closed with the connection
     """
 
     compressors: List[Compressor]
@@ -596,14 +673,21 @@ class StateOpen:
     Starts at -1
     """
 
+    identifier_pool: RandomBytesPool
+    """Where the broadcaster gets the random identifiers for the RECEIVE_STREAM
+    messages it sends, so it doesn't need to go to the operating system for every
+    message
+    """
+
     read_task: asyncio.Task[WSMessage]
     """The task that is currently responsible for getting the next message on the
     websocket from the ASGI server
     """
 
-    internal_message_task: asyncio.Task[InternalMessage]
+    internal_message_task: asyncio.Future[InternalMessage]
     """The task that is currently responsible for getting the next message from 
-    my_receiver.queue
+    my_receiver.queue. When a message was already queued this is instead an
+    already completed future holding it, so bursts do not need a task per message
     """
 
     notify_stream_state: Optional[NotifyStreamState]
@@ -1,11 +1,159 @@
 import asyncio
-from typing import cast
+import io
+import struct
+from typing import Any, Iterable, Optional, Tuple, Union, cast
 
 from fastapi import WebSocket
+from lonelypsp.stateful.constants import (
+    PubSubStatefulMessageFlags,
+    SubscriberToBroadcasterStatefulMessageType,
+)
+from lonelypsp.stateful.messages.confirm_receive import S2B_ConfirmReceive
+from lonelypsp.stateful.messages.continue_receive import S2B_ContinueReceive
+from lonelypsp.stateful.parser_helpers import S2B_MessagePrefix
 
 from lonelypss.util.websocket_message import WSMessage
 
+_PREFIX = struct.Struct(">HH")
+"""the flags and message type that start every subscriber to broadcaster message"""
+
+_UINT16 = struct.Struct(">H")
+"""the length prefix of each header value when using minimal headers"""
+
+_MESSAGE_TYPES_BY_VALUE = {
+    message_type.value: message_type
+    for message_type in SubscriberToBroadcasterStatefulMessageType
+}
+"""looking up the enum member directly is much faster than calling the enum
+constructor for every message
+"""
+
+_FLAGS_BY_VALUE = {
+    flags.value: flags
+    for flags in (
+        PubSubStatefulMessageFlags(0),
+        PubSubStatefulMessageFlags.MINIMAL_HEADERS,
+    )
+}
+"""the flags subscribers actually send; anything else goes through the enum
+constructor
+"""
+
 
 def make_websocket_read_task(websocket: WebSocket) -> asyncio.Task[WSMessage]:
     """Creats an asyncio task that provides a better typed version of websocket.receive()"""
     return cast(asyncio.Task[WSMessage], asyncio.create_task(websocket.receive()))
+
+
+async def wait_first_completed(
+    futures: Iterable["asyncio.Future[Any]"], *, timeout: Optional[float] = None
+) -> None:
+    """Waits until at least one of the given futures is done, or until the
+    timeout (in seconds) elapses if one is given. Equivalent to
+    `asyncio.wait(futures, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)`,
+    but without building the done and pending sets, which matters when called
+    every time through the websocket state machine.
+    """
+    futures = list(futures)
+    for fut in futures:
+        if fut.done():
+            return
+
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+
+    def _on_done(_: "Optional[asyncio.Future[Any]]") -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+    for fut in futures:
+        fut.add_done_callback(_on_done)
+    timeout_handle = (
+        loop.call_later(timeout, _on_done, None) if timeout is not None else None
+    )
+    try:
+        await waiter
+    finally:
+        if timeout_handle is not None:
+            timeout_handle.cancel()
+        for fut in futures:
+            fut.remove_done_callback(_on_done)
+
+
+def parse_s2b_payload_prefix(payload: bytes) -> Tuple[S2B_MessagePrefix, io.BytesIO]:
+    """Interprets the first four bytes of a subscriber to broadcaster message
+    directly from the payload, returning the prefix and a reader positioned
+    just after it, ready for the message-specific parser.
+
+    Equivalent to `parse_s2b_message_prefix(io.BytesIO(payload))`, but unpacks
+    both fields in a single call rather than two reads and int conversions, and
+    looks up the enum members rather than constructing them.
+
+    Raises ValueError if the payload is too short or the prefix is malformed
+    """
+    try:
+        flags_int, message_type_int = _PREFIX.unpack_from(payload, 0)
+    except struct.error as e:
+        raise ValueError("message too short to contain prefix") from e
+
+    flags = _FLAGS_BY_VALUE.get(flags_int)
+    if flags is None:
+        flags = PubSubStatefulMessageFlags(flags_int)
+    message_type = _MESSAGE_TYPES_BY_VALUE.get(message_type_int)
+    if message_type is None:
+        message_type = SubscriberToBroadcasterStatefulMessageType(message_type_int)
+
+    prefix = S2B_MessagePrefix(flags, message_type)
+    reader = io.BytesIO(payload)
+    reader.seek(_PREFIX.size)
+    return prefix, reader
+
+
+def parse_s2b_minimal_ack(
+    type: SubscriberToBroadcasterStatefulMessageType, payload: bytes
+) -> Union[S2B_ConfirmReceive, S2B_ContinueReceive]:
+    """Parses a CONFIRM_RECEIVE or CONTINUE_RECEIVE message which was sent with
+    minimal headers, given the entire payload including the prefix.
+
+    Acknowledgements are the most common messages from subscribers and their
+    headers are positional, so they can be read directly from the payload
+    rather than through the generic header parsing. Validates the same as the
+    lonelypsp parsers.
+
+    Raises ValueError if the message is malformed
+    """
+    identifier, offset = _read_minimal_header(payload, _PREFIX.size)
+    if len(identifier) > 64:
+        raise ValueError("x-identifier must be at most 64 bytes")
+
+    if type == SubscriberToBroadcasterStatefulMessageType.CONFIRM_RECEIVE:
+        return S2B_ConfirmReceive(
+            type=SubscriberToBroadcasterStatefulMessageType.CONFIRM_RECEIVE,
+            identifier=identifier,
+        )
+
+    if type != SubscriberToBroadcasterStatefulMessageType.CONTINUE_RECEIVE:
+        raise ValueError(f"not an acknowledgement: {type}")
+
+    part_id_bytes, _ = _read_minimal_header(payload, offset)
+    if len(part_id_bytes) > 8:
+        raise ValueError("x-part-id must be at most 8 bytes")
+
+    return S2B_ContinueReceive(
+        type=SubscriberToBroadcasterStatefulMessageType.CONTINUE_RECEIVE,
+        identifier=identifier,
+        part_id=int.from_bytes(part_id_bytes, "big"),
+    )
+
+
+def _read_minimal_header(payload: bytes, offset: int) -> Tuple[bytes, int]:
+    try:
+        (length,) = _UINT16.unpack_from(payload, offset)
+    except struct.error as e:
+        raise ValueError("message too short to contain header length") from e
+
+    start = offset + _UINT16.size
+    end = start + length
+    if end > len(payload):
+        raise ValueError("message too short to contain header value")
+    return payload[start:end], end